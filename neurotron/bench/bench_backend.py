@@ -0,0 +1,42 @@
+"""
+bench_backend.py: spike and learn steps of a prediction terminal for all
+    available compute backends (NEUROTRON_BACKEND / neurotron.math.backend)
+
+    $ python bench/bench_backend.py
+"""
+
+import timeit
+import numpy as np
+from neurotron.math import Matrix
+from neurotron.math.backend import available, use, backend
+from neurotron.cluster.setup import Predict
+from neurotron.cluster.terminal import Terminal
+
+#===============================================================================
+# benchmark
+#===============================================================================
+
+def bench(shape=(4,100,10,5),number=20):
+    m,n,d,s = shape
+    predict = Terminal(Predict(*shape,rand=True))
+    rng = np.random.RandomState(0)
+    v = Matrix(1,m*n);  v[0,:] = rng.rand(m*n) > 0.5
+    L = Matrix(m,n);  L[:,:] = rng.rand(m,n) > 0.5
+    print('terminal %s, %d runs' % (shape,number))
+    print('%-10s %12s %12s' % ('backend','spike [us]','learn [us]'))
+    saved = backend()
+    for name in available():
+        use(name)
+        runs = 1 if name == 'reference' else number
+        predict.spike(v);  predict.learn(L)     # warm up (jit compile)
+        t0 = timeit.timeit(lambda: predict.spike(v),number=runs) / runs
+        t1 = timeit.timeit(lambda: predict.learn(L),number=runs) / runs
+        print('%-10s %12.1f %12.1f' % (name,t0*1e6,t1*1e6))
+    use(saved)
+
+#===============================================================================
+# main
+#===============================================================================
+
+if __name__ == '__main__':
+    bench()
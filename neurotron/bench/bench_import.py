@@ -0,0 +1,46 @@
+"""
+bench_import.py: import time of the neurotron package
+    measures 'import neurotron' in fresh interpreters and checks that the
+    plotting stack (matplotlib) is only loaded once a Monitor is created
+
+    $ python bench/bench_import.py
+"""
+
+import subprocess
+import sys
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def measure(code):      # import time [ms] and whether matplotlib got loaded
+    code = 'import sys, time; t0 = time.perf_counter(); ' + code + \
+           '; print((time.perf_counter()-t0)*1e3, "matplotlib" in sys.modules)'
+    out = subprocess.run([sys.executable,'-c',code],capture_output=True,
+                         text=True,check=True)
+    ms,mpl = out.stdout.split()[-2:]
+    return float(ms),mpl == 'True'
+
+#===============================================================================
+# benchmark
+#===============================================================================
+
+def bench(number=5):
+    cases = [
+        ('neurotron',          'import neurotron'),
+        ('neurotron+pyplot',   'import neurotron, matplotlib.pyplot'),
+        ('Monitor(2,5)',       'import matplotlib; matplotlib.use("Agg"); '
+                               'from neurotron import Monitor; Monitor(2,5)'),
+    ]
+    print('fresh interpreter, best of %d runs' % number)
+    print('%-18s %12s %11s' % ('import','time [ms]','matplotlib'))
+    for name,code in cases:
+        runs = [measure(code) for k in range(number)]
+        print('%-18s %12.1f %11s' % (name,min(ms for ms,_ in runs),runs[0][1]))
+
+#===============================================================================
+# main
+#===============================================================================
+
+if __name__ == '__main__':
+    bench()
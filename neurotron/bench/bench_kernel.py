@@ -0,0 +1,41 @@
+"""
+bench_kernel.py: cluster iteration by phases (Core.iterate) versus the
+    fused step kernel (neurotron.cluster.kernel, requires numba)
+
+    $ python bench/bench_kernel.py
+"""
+
+import timeit
+import numpy as np
+from neurotron.cluster.cells import Cluster
+from neurotron.cluster import kernel
+
+#===============================================================================
+# benchmark
+#===============================================================================
+
+def bench(shapes=((2,5,2,3),(4,10,4,3),(4,100,10,5)),number=200):
+    print('fused kernel available:',kernel.available)
+    print('%-16s %14s %14s %9s' % ('cluster','phases [us]','fused [us]',
+                                   'speedup'))
+    for shape in shapes:
+        m,n,d,s = shape
+        rng = np.random.RandomState(0)
+        F = [list((rng.rand(n) > 0.6).astype(int)) for t in range(number)]
+        times = []
+        for fused in (False,True):
+            np.random.seed(0)
+            cells = Cluster(*shape,rand=True);  cells.fused = fused
+            cells.iterate(cells.embed(F[0]))    # warm up (jit compile)
+            it = iter(F)
+            run = lambda: cells.iterate(cells.embed(next(it)))
+            times.append(timeit.timeit(run,number=number) / number * 1e6)
+        print('%-16s %14.1f %14.1f %8.1fx' %
+              (str(shape),times[0],times[1],times[0]/times[1]))
+
+#===============================================================================
+# main
+#===============================================================================
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,112 @@
+"""
+bench_matfun.py: micro benchmark of matfun reductions (MAX,MIN,SUM,ALL,ANY)
+    compares the native ndarray reductions of neurotron.math.matfun with
+    the former element-wise loop implementations (kept here as reference)
+
+    $ python bench/bench_matfun.py
+"""
+
+import timeit
+import numpy as np
+from neurotron.math.matrix import Matrix
+from neurotron.math.matfun import MAX, MIN, SUM, ALL, ANY
+
+#===============================================================================
+# reference implementations (element-wise loops)
+#===============================================================================
+
+def _collapse(M):
+    m,n = M.shape
+    if m != 1 or n != 1:
+        return M
+    result = M.item()
+    return int(result) if int(result) == result else result
+
+def _minmax(f,arg1,arg2=None):
+    m,n = arg1.shape
+    if arg2 is None:
+        if m == 1 or n == 1:
+            s = arg1[0,0]
+            for i in range(m):
+                for j in range(n): s = f(s,arg1[i,j])
+            return int(s) if s == int(s) else s
+        M = Matrix(1,n)
+        for j in range(n):
+            x = arg1[0,j]
+            for i in range(1,m): x = f(arg1[i,j],x)
+            M[0,j] = x
+    else:
+        M = Matrix(m,n)
+        for i in range(m):
+            for j in range(n):
+                M[i,j] = f(arg1[i,j],arg2[i,j])
+    return _collapse(M)
+
+def old_MAX(arg1,arg2=None): return _minmax(max,arg1,arg2)
+def old_MIN(arg1,arg2=None): return _minmax(min,arg1,arg2)
+
+def old_SUM(arg):
+    m,n = arg.shape
+    if m == 1 or n == 1:
+        s = 0
+        for i in range(m):
+            for j in range(n): s += arg[i,j]
+        return s
+    out = Matrix(1,n)
+    for j in range(n):
+        s = 0
+        for i in range(m): s += arg[i,j]
+        out[0,j] = s
+    return out
+
+def _allany(f,arg):
+    m,n = arg.shape
+    if m == 1 or n == 1:
+        return f(arg) + 0
+    M = Matrix(1,n)
+    for j in range(n):
+        M[0,j] = f(arg[:,j])
+    return _collapse(M)
+
+def old_ALL(arg): return _allany(all,arg)
+def old_ANY(arg): return _allany(any,arg)
+
+#===============================================================================
+# benchmark
+#===============================================================================
+
+def _same(a,b):
+    if isinstance(a,Matrix) or isinstance(b,Matrix):
+        return np.array_equal(np.asarray(a),np.asarray(b))
+    return a == b
+
+def bench(m=10,n=40,number=200):
+    np.random.seed(0)
+    A = Matrix(np.random.randint(-5,5,(m,n)).astype(float))
+    B = Matrix(np.random.randint(-5,5,(m,n)).astype(float))
+    v = A[0,:]
+    cases = [
+        ('MAX(A)',   lambda: old_MAX(A),   lambda: MAX(A)),
+        ('MAX(A,B)', lambda: old_MAX(A,B), lambda: MAX(A,B)),
+        ('MIN(A)',   lambda: old_MIN(A),   lambda: MIN(A)),
+        ('MIN(A,B)', lambda: old_MIN(A,B), lambda: MIN(A,B)),
+        ('MAX(v)',   lambda: old_MAX(v),   lambda: MAX(v)),
+        ('SUM(A)',   lambda: old_SUM(A),   lambda: SUM(A)),
+        ('SUM(v)',   lambda: old_SUM(v),   lambda: SUM(v)),
+        ('ALL(A)',   lambda: old_ALL(A),   lambda: ALL(A)),
+        ('ANY(A)',   lambda: old_ANY(A),   lambda: ANY(A)),
+    ]
+    print('matrix size: %dx%d, %d runs' % (m,n,number))
+    print('%-10s %12s %12s %9s' % ('function','old [us]','new [us]','speedup'))
+    for name,old,new in cases:
+        assert _same(old(),new()), name
+        t0 = timeit.timeit(old,number=number) / number * 1e6
+        t1 = timeit.timeit(new,number=number) / number * 1e6
+        print('%-10s %12.1f %12.1f %8.1fx' % (name,t0,t1,t0/t1))
+
+#===============================================================================
+# main
+#===============================================================================
+
+if __name__ == '__main__':
+    bench()
@@ -0,0 +1,72 @@
+"""
+bench_share.py: memory per serving worker for copied, mmapped and shared
+    synapse stores. Each worker builds a read-only cluster (private copy by
+    load(mmap=False), file mapping by load(mmap=True), shared memory by
+    attach()), runs a prediction step over all cells and reports its
+    private memory (Linux, /proc/self/smaps_rollup)
+
+    $ python bench/bench_share.py
+"""
+
+import multiprocessing
+import shutil
+import tempfile
+import time
+import numpy as np
+from neurotron.cluster.cells import Cluster
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def private():           # private memory [MB] of the calling process
+    kb = 0
+    with open('/proc/self/smaps_rollup') as fp:
+        for line in fp:
+            if line.startswith(('Private_Clean','Private_Dirty')):
+                kb += int(line.split()[1])
+    return kb / 1024
+
+def serve(args):         # worker: build cluster, predict, report memory
+    mode,source = args
+    base = private()
+    if mode == 'shared':
+        cells = Cluster.attach(source)
+    else:
+        cells = Cluster.load(source,mmap=(mode == 'mmap'))
+    built = private() - base
+    m,n,d,s = cells.shape
+    cells._predict(np.ones(m*n,dtype=bool))     # touch all synapses
+    return built,private() - base
+
+#===============================================================================
+# benchmark
+#===============================================================================
+
+def bench(shape=(10,2000,10,10),workers=4):
+    cells = Cluster(*shape);  m,n,d,s = shape
+    rng = np.random.RandomState(0)
+    cells._predict.K.data[...] = rng.randint(0,m*n,(m,n,d,s))
+    path = tempfile.mkdtemp();  cells.save(path)
+    share = cells.share()
+    print('cluster %s, %.1f MB synapse store, %d workers' %
+          (shape,share.nbytes()/2**20,workers))
+    print('%-8s %12s %12s %10s' % ('mode','build [MB]','step [MB]','time [s]'))
+    ctx = multiprocessing.get_context('spawn')
+    try:
+        for mode in ('copy','mmap','shared'):
+            source = share if mode == 'shared' else path
+            t0 = time.perf_counter()
+            with ctx.Pool(workers) as pool:
+                mb = pool.map(serve,[(mode,source)]*workers)
+            print('%-8s %12.1f %12.1f %10.2f' % (mode,max(b for b,_ in mb),
+                  max(s for _,s in mb),time.perf_counter()-t0))
+    finally:
+        share.unlink();  shutil.rmtree(path)
+
+#===============================================================================
+# main
+#===============================================================================
+
+if __name__ == '__main__':
+    bench()
@@ -10,6 +10,8 @@ neurotron: building blocks for neural computing circuits
        Excite      parameters for excitation terminal
        Predict     parameters for prediction terminal
        Terminal    neurotron terminal
+       Sparse      prediction terminal with sparse synapse store
+       Share       named read-only arrays in shared memory
        Token       wrapper for token dicts
        Text        access splitted text
        Cell        access to cluster cell
@@ -60,6 +62,8 @@ import neurotron.math.field
 
 import neurotron.cluster.setup
 import neurotron.cluster.terminal
+import neurotron.cluster.sparse
+import neurotron.cluster.share
 import neurotron.cluster.cells
 import neurotron.cluster.trainer
 import neurotron.ansi
@@ -80,6 +84,8 @@ Predict = neurotron.cluster.setup.Predict
 Matrix = neurotron.math.matrix.Matrix
 Field  = neurotron.math.field.Field
 Terminal = neurotron.cluster.terminal.Terminal
+Sparse = neurotron.cluster.sparse.Sparse
+Share = neurotron.cluster.share.Share
 
 Cluster = neurotron.cluster.cells.Cluster
 Cells = neurotron.cluster.cells.Cells
@@ -8,6 +8,8 @@ neurotron.cluster: neural cluster computing
         Excite      parameters for excitation terminal
         Predict     parameters for prediction terminal
         Terminal    neurotron terminal
+        Sparse      prediction terminal with sparse synapse store
+        Share       named read-only arrays in shared memory
         Token       wrapper for token dicts
         Text        access splitted text
         SynapseErr  Synapse Exception
@@ -22,6 +24,8 @@ neurotron.cluster: neural cluster computing
 import neurotron.cluster.cells
 import neurotron.cluster.setup
 import neurotron.cluster.terminal
+import neurotron.cluster.sparse
+import neurotron.cluster.share
 import neurotron.cluster.monitor
 import neurotron.cluster.toy
 import neurotron.cluster.trainer
@@ -36,6 +40,8 @@ Collab = setup.Collab
 Excite = setup.Excite
 Predict = setup.Predict
 Terminal = terminal.Terminal
+Sparse = sparse.Sparse
+Share = share.Share
 
 Cluster = cells.Cluster
 Cells = cells.Cells
@@ -4,18 +4,24 @@ module neurotron.cluster.cells
     class Token    # wrapper for token dicts
 """
 
+import os
+import errno
 from neurotron.math.attribute import Attribute
 from neurotron.math.matrix import Matrix
 from neurotron.math.field import Field
-from neurotron.cluster.terminal import Terminal
+from neurotron.cluster.terminal import Terminal, _value
+from neurotron.cluster.sparse import Sparse
 from neurotron.cluster.setup import Plain,Collab,Excite,Predict
 from neurotron.cluster.monitor import Monitor, Record
 
 from neurotron.cluster.toy import Toy
 from neurotron.cluster.token import Token
+from neurotron.cluster.share import Share
+import neurotron.cluster.kernel as kernel
 
 import neurotron.math.matfun as mf
 import neurotron.math as nm
+import numpy as np
 isa = isinstance
 
 #=========================================================================
@@ -24,9 +30,12 @@ isa = isinstance
 
 class SynapseErr(Exception):
     """
-    class Synapse: exception to raise if there are no more free synapses
+    class Synapse: exception to raise if there are no more free synapses,
+    failed holds the failed (n,k): pair number n and target cell k
     """
-    pass
+    def __init__(self,msg='',failed=None):
+        super().__init__(msg)
+        self.failed = [] if failed is None else failed
 
 #=========================================================================
 # class Out
@@ -74,8 +83,27 @@ class Cell(Attribute):
 # class Core (Cluster Core)
 #=========================================================================
 
+def _layer(l):            # property for layer l of the state tensor
+    def fget(self):
+        return self.data[l].view(Matrix)
+    def fset(self,M):
+        self.data[l][...] = M
+    return property(fget=fget,fset=fset)
+
 class Core(Attribute):
-    def __init__(self,m=2,n=7,d=4,s=3,f=None,verbose=0,rand=False):
+    """
+    class Core: cluster core. The cell state is held in a (8,m,n) uint8
+    tensor data with layers U,Q,D,B,Y,S,X,L, which are accessed as Matrix
+    views (assignment copies into the layer).
+    >>> cells = Cluster(1,3,2,3);  cells.Y = Matrix([1,0,1]);  cells.data[4]
+    array([[1, 0, 1]], dtype=uint8)
+    >>> cells.relax();  cells.Y
+    [0 0 0]
+    """
+    layers = 'U Q D B Y S X L'       # layer order of state tensor
+
+    def __init__(self,m=2,n=7,d=4,s=3,f=None,verbose=0,rand=False,
+                 sparse=False):
         if f is None: f = n
         self.shape = (m,n,d,s)
         self.sizes = (f,n*m)               # (M,N)
@@ -84,24 +112,40 @@ class Core(Attribute):
         self.fdx = m*n+Matrix(range(f))    # access feedforward vector
         self.k = Matrix(range(n*m))
         self.verbose = verbose
+        self.learning = True               # learning enabled in react phase
+        self.fused = False                 # iterate by fused step kernel
 
         self._excite = Terminal(Plain(m,n))  # simple excite terminal
         self._collab = Terminal(Collab(m,n,d,s))
-        self._predict = Terminal(Predict(m,n,d,s,rand=rand),verbose=verbose)
+        predict = Predict(m,n,d,s,rand=rand,sparse=sparse)
+        terminal = Sparse if sparse else Terminal
+        self._predict = terminal(predict,verbose=verbose)
         self.init()
 
     def init(self):
         M,N = self.sizes
-        self.y = nm.zeros(1,M+N)
+        if getattr(self,'y',None) is None:
+            self.buffer(M)
+        else:
+            self.y.fill(0)
         m,n = self.shape[:2]
-        self.U = Matrix(m,n)
-        self.Q = Matrix(m,n)
-        self.D = Matrix(m,n)
-        self.B = Matrix(m,n)
-        self.X = Matrix(m,n)
-        self.Y = Matrix(m,n)
-        self.S = Matrix(m,n)
-        self.L = Matrix(m,n)
+        if getattr(self,'data',None) is None:  # k = i+j*m friendly layout
+            self.data = np.zeros((8,n,m),dtype=np.uint8).transpose(0,2,1)
+        else:
+            self.data.fill(0)
+
+    def buffer(self,M):   # allocate persistent y buffer with M feedforward bits
+        """
+        >>> cells = Cluster(1,3,2,3,4)
+        >>> cells.buffer(2);  cells.feedforward[0,:] = [1,1];  print(cells.y)
+        [0 0 0 1 1]
+        >>> cells.context[0,0] = 1;  print(cells.y)
+        [1 0 0 1 1]
+        """
+        N = self.sizes[1]
+        self.y = nm.zeros(1,N+M)
+        self.context = self.y[:,:N]        # view on context part
+        self.feedforward = self.y[:,N:]    # view on feedforward part
 
     def zero(self):
         return Matrix(*self.shape[:2])
@@ -121,7 +165,7 @@ class Core(Attribute):
         return y
 
     def relax(self,y=None):
-        for x in 'U Q D B Y S'.split(): self.set(x,self.zero())
+        self.data[:6].fill(0)          # U,Q,D,B,Y,S
         return self.update(y)
 
     def stimu(self,y):
@@ -132,7 +176,7 @@ class Core(Attribute):
     def react(self,y):
         self.Y = self.U * self.X
         self.L = self.X * self.Y
-        self._predict.learn(self.L)
+        if self.learning: self._predict.learn(self.L)
         return self.update(y)
 
     def depress(self,y):
@@ -157,6 +201,8 @@ class Core(Attribute):
         return y
 
     def iterate(self,y):
+        if self.fused and kernel.fused(self):
+            return kernel.step(self,y)     # compiled, same result
         y = self.relax(y);
         y = self.stimu(y);
         y = self.react(y);
@@ -166,14 +212,35 @@ class Core(Attribute):
         y = self.predict(y);
         return y
 
+    def infer(self,X,F):      # batched inference step (no learning)
+        """
+        one iteration for a batch of B states with predictions X (B,m*n)
+        and feedforward inputs F (B,M); returns (Y,X) of the next state
+        (linear index order of cells)
+        >>> cells = Cluster(1,3,2,3);  cells.learning = False
+        >>> X = np.zeros((2,3),dtype=bool)
+        >>> Y,X = cells.infer(X,np.array([[1,0,0],[0,1,1]]));  Y.astype(int)
+        array([[1, 0, 0],
+               [0, 1, 1]])
+        """
+        U = self._excite.batch(F)
+        Y = U & X                            # react
+        D = self._collab.batch(Y)            # depress
+        Y = Y | (U & ~D)                     # excite & burst
+        return Y,self._predict.batch(Y)      # predict
+
+    U = _layer(0);  Q = _layer(1);  D = _layer(2);  B = _layer(3)
+    Y = _layer(4);  S = _layer(5);  X = _layer(6);  L = _layer(7)
+
 #=========================================================================
 # class Cluster
 #=========================================================================
 
 class Cluster(Core):
     verbose = 0
-    def __init__(self,m=4,n=10,d=2,s=5,f=None,verbose=0,rand=False):
-        super().__init__(m,n,d,s,f,verbose=verbose,rand=rand)
+    def __init__(self,m=4,n=10,d=2,s=5,f=None,verbose=0,rand=False,
+                 sparse=False):
+        super().__init__(m,n,d,s,f,verbose=verbose,rand=rand,sparse=sparse)
 
     def __len__(self):
         m,n,d,s = self.shape
@@ -204,18 +271,16 @@ class Cluster(Core):
         else:
             return i + j*m
 
+    _order = [3,2,7,1,5,0,6,4]        # state order: B,D,L,Q,S,U,X,Y
+
     def state(self,i,j):
-        tags = ['B','D','L','Q','S','U','X','Y']
-        s = Matrix(1,len(tags))
-        for k in range(len(tags)):
-            s[k] = self.get(tags[k])[i,j]
-        return s
+        return Matrix(self.data[self._order,i,j].astype(float))
 
     def smap(self,label=''):
         m,n,d,s = self.shape
         S = Field(m,n,1,8)
-        for k in range(m*n):
-            S[k] = self.state(*self.kappa(k))
+        S.tensor()[:,0,:] = self.data[self._order].transpose(0,2,1).\
+                            reshape(8,m*n).T
         S.smap(label)
 
     def map(self):
@@ -304,8 +369,19 @@ class Cluster(Core):
         return y
 
     def embed(self,stimulus):
-        M,N = self.sizes
-        return nm.row(self.y[0,:N],stimulus)
+        """
+        >>> cells = Cluster(1,3,2,3,2)
+        >>> y = cells.embed([1,0]);  print(y)
+        [0 0 0 1 0]
+        >>> y is cells.embed(Matrix([0,1])), y
+        (True, [0 0 0 0 1])
+        """
+        if not isa(stimulus,Matrix): stimulus = Matrix(stimulus)
+        if stimulus.size != self.feedforward.size:
+            c = self.context.copy()
+            self.buffer(stimulus.size);  self.context[:] = c
+        self.feedforward[:] = np.asarray(stimulus).reshape(1,-1)
+        return self.y
 
     def connect(self,idx,kdx):
         """
@@ -335,36 +411,116 @@ class Cluster(Core):
            |  000  |  000  |  000  |  000  |  000  |
            +-------+-------+-------+-------+-------+
         """
-        assert isa(idx,list)
-        assert isa(kdx,list)
+        self.connect_many([(idx,kdx)])
+
+    def connect_many(self,pairs):
+        """
+        connect a list of (idx,kdx) pairs in one pass; raises SynapseErr
+        for the failed (n,k) after all other connections are written
+        >>> cells = Cluster(1,4,1,3)
+        >>> try:
+        ...     cells.connect_many([([0,1],[2]),([1],[2,3]),([2],[3])])
+        ... except SynapseErr as err:
+        ...     print(err,err.failed)
+        K[2] [0 1 0]
+        no free synapses to connect: [2] [(1, 2)]
+        >>> cells._predict.K.map()
+        +-000/0-+-001/1-+-002/2-+-003/3-+
+        |  000  |  000  |  010  |  200  |
+        +-------+-------+-------+-------+
+        """
         m,n,d,s = self.shape
-        if len(idx) > s:
-            raise Exception('more than %g indices provided (arg2)'%s)
         predict = self._predict
+        padded = []
+        for idx,kdx in pairs:
+            assert isa(idx,list)
+            assert isa(kdx,list)
+            if len(idx) > s:
+                raise Exception('more than %g indices provided (arg2)'%s)
+
+                # enlarge idx to match permanence row
 
-            # enlarge idx to match permanence row
-
-        while len(idx) < s: idx += [0]
-
-        for k in kdx:
-            done = False
-            for ii in range(d):
-                if mf.ALL(predict.P[k][ii,:]==0):
-                    for jj in range(s):
-                        predict.K[k][ii,jj] = 0
-                    for jj in range(len(idx)):
-                        predict.K[k][ii,jj] = idx[jj]
-                        predict.P[k][ii,jj] = 0.5
-                    done = True
-                    break
-                elif mf.ALL(predict.K[k][ii,:]==Matrix(idx)):
-                    if mf.ALL(predict.K[k][ii,:]==Matrix(idx)):
-                        done = True
-                        break
-            if not done:
+            padded.append((idx + [0 for k in range(s-len(idx))],kdx))
+
+        failed = predict.connect_many(padded)
+        predict.refresh()
+        if failed:
+            for nn,k in failed:
                 print('K[%g]' % k, predict.K[k])
-                raise SynapseErr('no free synapses to connect: [%g]'%k)
-            predict.W[k] = predict.P[k] >= predict.eta
+            msg = 'no free synapses to connect: %s' % [k for nn,k in failed]
+            raise SynapseErr(msg,failed)
+
+    def save(self,path):
+        """
+        save a snapshot to directory path; synapse tensors are stored as raw
+        .npy arrays, which load() maps read-only by default, so that many
+        inference processes share one copy (learning is disabled then,
+        use mmap=False for a writable cluster)
+        >>> import tempfile;  path = tempfile.mkdtemp()
+        >>> cells = Cluster(2,5,2,3);  cells.connect([0,6,8],[4,6,8])
+        >>> cells.save(path);  loaded = Cluster.load(path)
+        >>> loaded.shape, loaded.learning, loaded._predict.K[4]
+        ((2, 5, 2, 3), False, [0 6 8; 0 0 0])
+        >>> loaded.learning = True;  loaded.iterate(loaded.embed([1,1,1,0,0]))
+        Traceback (most recent call last):
+        ...
+        Exception: read-only synapse store (load with mmap=False to modify)
+        """
+        os.makedirs(path,exist_ok=True)
+        np.savez(os.path.join(path,'cluster.npz'),**self._meta())
+        self._predict.save(path,'predict')
+
+    def _meta(self):                   # snapshot meta data
+        return dict(shape=self.shape,f=self.sizes[0],
+                    sparse=isa(self._predict,Sparse))
+
+    @classmethod
+    def load(cls,path,mmap=True):
+        with np.load(os.path.join(path,'cluster.npz')) as data:
+            meta = {key:_value(data[key]) for key in data.files}
+        file = os.path.join(path,'token.npz')
+        token = Token.load(file) if os.path.exists(file) else None
+        cells = cls._restore(meta,token)
+        cells._predict.load(path,'predict',mmap)
+        cells.learning = not mmap
+        return cells
+
+    @classmethod
+    def _restore(cls,meta,token=None):  # construct cluster from meta data
+        return cls(*meta['shape'],f=meta['f'],sparse=meta['sparse'])
+
+    def share(self):
+        """
+        copy the synapse store into shared memory. The returned Share is
+        passed (pickled) to worker processes, which build clusters on the
+        shared read-only synapses by attach() and hold only their private
+        cell state; the serving process unlinks the share at the end
+        >>> import pickle
+        >>> cells = Cluster(2,5,2,3,rand=False)
+        >>> cells.connect([0,6,8],[4,6,8]);  share = cells.share();  share
+        Share(K,P,W,index,1920 bytes)
+        >>> worker = Cluster.attach(pickle.loads(pickle.dumps(share)))
+        >>> worker._predict.K[4], worker.learning
+        ([0 6 8; 0 0 0], False)
+        >>> share.unlink()
+        """
+        meta,arrays = self._predict.store()
+        token = getattr(self,'token',None)
+        if token is not None: token = (list(token.items()),token.autopimp)
+        return Share(arrays,dict(cluster=self._meta(),predict=meta,
+                                 token=token))
+
+    @classmethod
+    def attach(cls,share):             # cluster on shared synapse store
+        meta = share.meta;  token = meta['token']
+        if token is not None:
+            items,autopimp = token
+            token = Token(items);  token.autopimp = autopimp
+        cells = cls._restore(meta['cluster'],token)
+        cells._predict.restore(meta['predict'],share.arrays())
+        cells.learning = False
+        cells._share = share           # keeps the shared blocks attached
+        return cells
 
     def decode(self):
         output = self.token.decode(self.Y)
@@ -388,7 +544,8 @@ class Cells(Cluster):
     >>> cells.token.shape, cells.token.range
     ((1, 20), (4, 4))
     """
-    def __init__(self,shape=(2,5,2,3),token=2,verbose=0,char=False):
+    def __init__(self,shape=(2,5,2,3),token=2,verbose=0,char=False,
+                 sparse=False):
         if isa(shape,str):
             tag = shape      # rename
             self.toy = Toy(tag)
@@ -398,12 +555,12 @@ class Cells(Cluster):
             self.toy = None
 
         nm.seed(1)
-        cells = super().__init__(*shape,verbose=verbose)
+        cells = super().__init__(*shape,verbose=verbose,sparse=sparse)
         self.token = self._token_setup(token)
         m,n,d,s = shape
 
-        f = None if self.token is None else self.token.null()
-        self.y = nm.row(nm.zeros(1,m*n),f)
+        if self.token is not None:
+            self.buffer(Matrix(self.token.null()).size)
         self.record = Record(self)
         self.char = char           # character processing mode
 
@@ -425,8 +582,8 @@ class Cells(Cluster):
         prediction = [seq[0],'->']
         for word in seq:
             mon = Monitor(m,n) if plot else None;
-            self.y = nm.row(nm.zeros(1,m*n),self.token[word])
-            self.y = self.step(mon,self.y,word)
+            self.context.fill(0)
+            self.y = self.step(mon,self.embed(self.token[word]),word)
             output,predict = self.decode()
             #mon.xlabel((n-1)/2,str(output) + ' -> ' + str(predict))
             prediction.append(predict)
@@ -489,6 +646,51 @@ class Cells(Cluster):
             prediction = self._compact(prediction)
         return prediction
 
+    def batch(self,seqs,next=None,detail=None):
+        """
+        run a batch of sequences with frozen synapses, returning the same
+        prediction lists as run() would with learning disabled; all
+        sequences are stepped together through a (B,m*n) state tensor
+        >>> from neurotron.cluster.trainer import Trainer
+        >>> train = Trainer(cells:=Cells((2,9,8,3),3))
+        >>> train('Mary likes to sing');  cells.learning = False
+        '<Mary likes to sing>'
+        >>> cells.batch(['Mary','Mary likes','to'],...)
+        [['Mary', '->', 'likes', 'to', 'sing', ''], ['Mary', 'likes', '->', 'to', 'sing', ''], ['to', '->', 'sing', '']]
+        >>> _ = [cells.run(seq,...) for seq in ['Mary','Mary likes','to']]
+        >>> _ == cells.batch(['Mary','Mary likes','to'],...)
+        True
+        """
+        m,n,d,s = self.shape
+        seqs = [self._expand(seq) if isa(seq,str) else seq for seq in seqs]
+        seqs = [seq.split() if isa(seq,str) else seq for seq in seqs]
+        predictions = [seq + ['->'] for seq in seqs]
+        todo = [list(seq) for seq in seqs]         # pending words
+        width = len(self.token.null())
+
+        X = np.zeros((len(seqs),m*n),dtype=bool)
+        while any(todo):
+            F = np.zeros((len(seqs),width))
+            active = [b for b in range(len(seqs)) if todo[b]]
+            for b in active:
+                bits = self.token[todo[b].pop(0)]
+                F[b,:len(bits)] = bits
+            Y,X = self.infer(X,F)
+            columns = X.reshape(len(seqs),n,m).any(axis=2).astype(int)
+            for b in active:
+                if todo[b]: continue
+                predict = self.token.decode(columns[b].tolist())
+                predictions[b].append(predict)
+                if next is Ellipsis:
+                    if isa(predict,list) and len(predict) > 0:
+                        todo[b] = [predict[0]]
+                        predictions[b][-1] = (predict[0],predict)
+                    elif predict != '':
+                        todo[b] = [predict]
+        if detail is None and self.char:
+            predictions = [self._compact(p) for p in predictions]
+        return predictions
+
     def predictive(self,list):
         for k in list:
             cells.X[k] = 1;
@@ -497,10 +699,43 @@ class Cells(Cluster):
     def map(self):
         self._predict.map()
 
-    def __str__(self):
-        self.record.clear();
-        self.record(self)
-        return self.record.pattern()
+    def save(self,path):
+        """
+        >>> import tempfile;  path = tempfile.mkdtemp()
+        >>> cells = Cells('Mary');  cells.save(path)
+        >>> loaded = Cells.load(path);  loaded.toy, loaded.token == cells.token
+        (Toy('Mary'), True)
+        >>> os.remove(os.path.join(path,'token.npz'))
+        >>> try: Cells.load(path)
+        ... except FileNotFoundError as error: print(error.filename[-9:])
+        token.npz
+        """
+        super().save(path)
+        self.token.save(os.path.join(path,'token.npz'))
+
+    @classmethod
+    def load(cls,path,mmap=True):      # (a Cells snapshot needs its token)
+        file = os.path.join(path,'token.npz')
+        if not os.path.exists(file):
+            raise FileNotFoundError(errno.ENOENT,'missing token file of '
+                                    'Cells snapshot',file)
+        return super().load(path,mmap)
+
+    def _meta(self):
+        meta = super()._meta()
+        meta.update(char=self.char,toy='' if self.toy is None else self.toy.tag)
+        return meta
+
+    @classmethod
+    def _restore(cls,meta,token=None):
+        cells = cls(meta['shape'],token,char=meta['char'],
+                    sparse=meta['sparse'])
+        if meta['toy'] != '': cells.toy = Toy(meta['toy'])
+        return cells
+
+    def __str__(self):                 # one-frame pattern (keeps self.record)
+        record = Record(self,size=1);  record(self)
+        return record.pattern()
 
     def __repr__(self):
         return self.__str__()
@@ -0,0 +1,133 @@
+"""
+module neurotron.cluster.kernel
+    fused      # can a cluster iterate with the fused step kernel?
+    step       # fused iteration step (numba compiled if available)
+
+The fused kernel runs relax, stimu, react (including predictive learning),
+depress, excite, burst and predict of Core.iterate() in one loop function
+over the flat cell state, with bit-identical results. It is compiled by
+numba on first use; without numba (or for sparse and verbose clusters)
+Core.iterate() falls back to the phase by phase iteration.
+"""
+
+import importlib.util
+import numpy as np
+from neurotron.cluster.terminal import Terminal
+
+available = importlib.util.find_spec('numba') is not None
+_compiled = None
+
+#===============================================================================
+# fused step
+#===============================================================================
+
+def fused(cells):     # can cells iterate with the fused step kernel?
+    """
+    >>> from neurotron.cluster.cells import Cluster
+    >>> cells = Cluster(2,5,2,3);  cells.fused = True
+    >>> fused(cells) == available
+    True
+    >>> fused(Cluster(2,5,2,3,sparse=True))
+    False
+    """
+    return available and type(cells._predict) is Terminal and \
+           cells.verbose == 0 and cells._predict.verbose == 0
+
+def step(cells,y,jit=True):
+    """
+    one iteration of cells for y (same as the phases of Core.iterate());
+    jit=False runs the kernel as plain Python (slow, for testing)
+    >>> from neurotron.cluster.cells import Cluster
+    >>> cells = Cluster(2,5,2,3);  cells.connect([1,3,5],[4,6,8])
+    >>> y = cells.embed([1,1,1,0,0]);  y = step(cells,y,jit=False);  y
+    [1 1 1 1 1 1 0 0 0 0 1 1 1 0 0]
+    >>> cells.X
+    [0 0 1 1 1; 0 0 0 0 0]
+    """
+    m,n,d,s = cells.shape
+    N = m*n;  M = y.size - N
+    state = cells.data.transpose(0,2,1).reshape(8,N)    # k = i+j*m order
+    v = np.asarray(y).reshape(-1)
+    assert np.shares_memory(state,cells.data) and np.shares_memory(v,y)
+
+    collab = cells._collab;  predict = cells._predict
+    if cells.learning: predict._writable()
+    collab.refresh();  predict.refresh()
+    pdelta,ndelta = predict.delta
+    args = (state,v,N,m,min(n,M),
+            collab._index.reshape(N,m-1),collab.W.tensor().reshape(N,m-1),
+            collab.theta,predict._index,predict.W.tensor(),
+            predict.P.tensor(),predict.I.tensor(),predict.eta,predict.theta,
+            2*pdelta,ndelta,cells.learning)
+    kernel = _kernel() if jit else _step
+    predict.updates += int(kernel(*args))
+    return y
+
+def _kernel():        # numba compiled step kernel (compiled on first call)
+    global _compiled
+    if _compiled is None:
+        import numba
+        _compiled = numba.njit(_step)
+    return _compiled
+
+def _step(state,y,N,m,F,cK,cW,ctheta,K,W,P,I,eta,theta,pdelta2,ndelta,
+          learn):
+    """
+    fused iteration over the flat state (8,N) with layers U,Q,D,B,Y,S,X,L
+    and y = [context(N),feedforward]; cK,cW (N,m-1) are the collaboration
+    synapses, K,W,P,I (N,d,s) the prediction synapses, permanences and
+    increments; returns the number of updated synapses
+    """
+    U = state[0];  Q = state[1];  D = state[2];  B = state[3]
+    Y = state[4];  S = state[5];  X = state[6];  L = state[7]
+    d = K.shape[1];  s = K.shape[2]
+    count = 0
+
+    for k in range(N):                 # relax, stimu, react (and learn)
+        j = k // m
+        u = 1 if j < F and y[N+j] > 0 else 0
+        U[k] = u;  Q[k] = 0;  D[k] = 0;  B[k] = 0;  S[k] = 0
+        Y[k] = u * X[k];  L[k] = X[k] * Y[k]
+        if learn and L[k] != 0:
+            for ii in range(d):
+                for jj in range(s):
+                    p = P[k,ii,jj] + I[k,ii,jj]
+                    if p == p:         # same as np.clip(p,0,1)
+                        p = p if p > 0 else 0.0
+                        p = p if p < 1 else 1.0
+                    if p != P[k,ii,jj]: count += 1
+                    P[k,ii,jj] = p
+                    W[k,ii,jj] = 1.0 if p >= eta else 0.0
+        y[k] = Y[k]
+
+    for k in range(N):                 # depress, excite, burst
+        acc = 0.0
+        for jj in range(cK.shape[1]):
+            acc += y[cK[k,jj]] * cW[k,jj]
+        D[k] = 1 if cK.shape[1] > 0 and acc >= ctheta else 0
+        Q[k] = U[k]
+        B[k] = 1 if D[k] == 0 and Q[k] != 0 else 0
+        Y[k] = 1 if Y[k] != 0 or B[k] != 0 else 0
+    for k in range(N):
+        y[k] = Y[k]
+
+    for k in range(N):                 # predict
+        spike = 0
+        for ii in range(d):
+            acc = 0.0
+            for jj in range(s):
+                acc += y[K[k,ii,jj]] * W[k,ii,jj]
+            sk = 1.0 if acc >= theta else 0.0
+            for jj in range(s):
+                I[k,ii,jj] = sk * (pdelta2*y[K[k,ii,jj]] - ndelta)
+            if sk != 0: spike = 1
+        S[k] = spike;  X[k] = spike
+    return count
+
+#===============================================================================
+# doc test
+#===============================================================================
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
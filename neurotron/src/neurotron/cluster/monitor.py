@@ -5,6 +5,7 @@ module neurotron.cluster.cluster
 """
 
 #from neurotron.cluster.cluster import Cluster
+import numpy as np
 from neurotron.screen import Screen
 
 #===========================================================================
@@ -13,79 +14,92 @@ from neurotron.screen import Screen
 
 class Record:
     """
-    cells=Cluster(2,7,2,5)
-    cells.U[0]=cells.X[0]=1
-    rec = Record(cells)
-    rec(cells)
-    rec.pattern()
+    class Record: records the cell states (tags u,q,x,l,b,d,y,s) of a cluster
+    as (T,8,m*n) uint8 history, one frame per call. With a size the record
+    is a ring buffer which keeps the last size frames, otherwise it grows.
+    >>> from neurotron.cluster.cells import Cluster
+    >>> cells = Cluster(2,7,2,5)
+    >>> cells.U[0] = cells.X[0] = 1
+    >>> rec = Record(cells);  rec(cells)
+    >>> rec.pattern()
     '|UX|-|-|-|-|-|-|-|-|-|-|-|-|-|'
+    >>> cells.U[0] = 0;  cells.Y[0] = cells.Y[1] = 1;  rec(cells)
+    >>> rec.pattern()[:12], rec.array().shape, rec.u[0]
+    ('|UX,XY|-Y|--', (2, 8, 14), array([1, 0], dtype=uint8))
+    >>> ring = Record(cells,size=1);  ring(cells);  ring(cells);  len(ring)
+    1
     """
-    def __init__(self,cells):
+    tags = 'uqxlbdys'                       # record order of cell states
+
+    def __init__(self,cells,size=None):
         self.n = len(cells)
+        self.size = size                    # ring buffer size (or None)
+        self._layer = [cells.layers.split().index(tag.upper())
+                       for tag in self.tags]
         self.clear()
 
     def clear(self):                        # clear recorder
-        n = self.n
-        self.u = [[] for k in range(n)];
-        self.q = [[] for k in range(n)];
-        self.x = [[] for k in range(n)];
-        self.l = [[] for k in range(n)];
-        self.b = [[] for k in range(n)];
-        self.d = [[] for k in range(n)];
-        self.y = [[] for k in range(n)];
-        self.s = [[] for k in range(n)];
+        cap = 16 if self.size is None else self.size
+        self.data = np.zeros((cap,8,self.n),dtype=np.uint8)
+        self.t = 0                          # number of recorded frames
+
+    def __len__(self):
+        return self.t if self.size is None else min(self.t,self.size)
 
     def __call__(self,cells):               # record state of cells
-        for k in cells.range():
-            cell = cells[k]
-            self.u[k].append(cell.u.out())
-            self.q[k].append(cell.q.out())
-            self.x[k].append(cell.x.out())
-            self.l[k].append(cell.l.out())
-            self.b[k].append(cell.b.out())
-            self.d[k].append(cell.d.out())
-            self.y[k].append(cell.y.out())
-            self.s[k].append(cell.s.out())
-
-            #pdelta,ndelta = cell.predict.synapses.delta
-            pdelta,ndelta = cell.delta()
-            if pdelta == 0 and ndelta == 0:
-                self.l[k][-1] = 0
+        cap = len(self.data)
+        if self.size is None and self.t == cap:  # grow buffer
+            self.data = np.concatenate((self.data,np.zeros_like(self.data)))
+        frame = self.data[self.t % len(self.data)]
+        frame[...] = cells.data[self._layer].transpose(0,2,1).\
+                     reshape(8,self.n)      # k = i + j*m order
+        pdelta,ndelta = cells._predict.delta
+        if pdelta == 0 and ndelta == 0:
+            frame[3] = 0                    # l
+        self.t += 1
+
+    def array(self):                        # (T,8,m*n) history, oldest first
+        T = len(self)
+        if T < len(self.data):
+            return self.data[:T].copy()
+        return np.roll(self.data,-(self.t % T),axis=0)
+
+    def save(self,file):                    # export history as .npy file
+        """
+        >>> import io;  from neurotron.cluster.cells import Cluster
+        >>> rec = Record(cells:=Cluster(1,3,2,3));  rec(cells);  rec(cells)
+        >>> file = io.BytesIO();  rec.save(file);  _ = file.seek(0)
+        >>> np.load(file).shape
+        (2, 8, 3)
+        """
+        np.save(file,self.array())
+
+    def _history(l):                        # property for (m*n,T) history
+        return property(fget=lambda self: self.array()[:,l,:].T)
+
+    u = _history(0);  q = _history(1);  x = _history(2);  l = _history(3)
+    b = _history(4);  d = _history(5);  y = _history(6);  s = _history(7)
 
     def log(self,cells,y,tag=None):
         print('\nSummary:',tag)
-        print("   u:",self.u)
-        print("   q:",self.q)
-        print("   x:",self.x)
-        print("   l:",self.l)
-        print("   b:",self.b)
-        print("   d:",self.d)
-        print("   y:",self.y)
-        print("   s:",self.s)
+        for tag in self.tags:
+            print("   %s:" % tag,getattr(self,tag).tolist())
         nc,nf = cells[0].sizes
         print("y = [c,f]:",[y[:nc],y[nc:nc+nf]])
 
     def pattern(self):
-        m = len(self.u);  n = len(self.u[0])
-        str = '';
-        for i in range(m):
-            line = '';  sep = ''
-            for j in range(n):
-                chunk = ''
-                if self.u[i][j]: chunk += 'U'
-                if self.q[i][j]: chunk += 'Q'
-                if self.x[i][j]: chunk += 'X'
-                if self.l[i][j]: chunk += 'L'
-                if self.d[i][j]: chunk += 'D'
-                if self.b[i][j]: chunk += 'B'
-                if self.y[i][j]: chunk += 'Y'
-                if self.s[i][j]: chunk += 'S'
-                if chunk == '':
-                    line += '-'
-                else:
-                    line += sep + chunk;  sep = ','
-            str += '|' + line;
-        return str + '|'
+        H = self.array()                    # (T,8,N)
+        codes = np.tensordot(1 << np.arange(8),H,axes=(0,1)).T  # (N,T)
+        words = _CHUNKS[codes]
+        used = codes != 0
+        words[~used] = '-'
+        comma = used & (np.cumsum(used,axis=1) > 1)  # ',' after 1st chunk
+        words[comma] = ',' + words[comma]
+        return '|' + '|'.join(''.join(row) for row in words) + '|'
+
+_CHUNKS = np.array([''.join(tag.upper() for k,tag in enumerate('uqxldbys')
+                    if code >> Record.tags.index(tag) & 1)
+                    for code in range(256)],dtype=object)
 
 #===========================================================================
 # class Monitor
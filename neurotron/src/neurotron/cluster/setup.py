@@ -225,36 +225,37 @@ class Predict(Attribute,Setup):
     >>> shape = (3,4,2,5)
     >>> Predict(*shape)
     Predict(3,4,2,5)
+    >>> Predict(*shape,sparse=True).K is None  # no dense fields for Sparse
+    True
     """
-    def __init__(self,m,n,d,s,eta=0.5,theta=3,rand=False):
+    def __init__(self,m,n,d,s,eta=0.5,theta=3,rand=False,sparse=False):
         super().__init__((m,n,d,s))
         self.eta = eta
         self.theta = theta
+        self.sparse = sparse
         if self.theta is not None:
             self.theta = min(self.theta,s)
+        if sparse and not rand:
+            return                     # empty sparse store needs no fields
         self.K = Field(m,n,d,s);  self.initK(rand)
         self.P = Field(m,n,d,s);  self.initP(rand)
-        self.W = Field(m,n,d,s);  self.initW(rand)
+        self.W = Field(m,n,d,s);  self.initW(rand)  # fields start zeroed
 
     def initK(self,random):
         m,n,d,s = self.shape
         if random:
             self.K.set(rand((m*d,n*s),m*n))
-        else:
-            self.K.set(zeros(m*d,n*s))
 
     def initP(self,random):
         m,n,d,s = self.shape
         if random:
             Q = 20                     # quantizing constant
             self.P.set((1+rand((m*d,n*s),Q))/Q)
-        else:
-            self.P.set(zeros(m*d,n*s))
         self.P.map = self.P.vmap
 
     def initW(self,random):
-        for k in self.W.range():
-            self.W[k] = self.P[k] >= self.eta
+        if random or self.eta <= 0:
+            self.W.data[...] = self.P.data >= self.eta
 
     def __str__(self):
         return 'Predict(%g,%g,%g,%g)' % self.shape
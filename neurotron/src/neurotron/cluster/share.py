@@ -0,0 +1,95 @@
+"""
+module neurotron.cluster.share
+    class Share  # named read-only arrays in shared memory
+"""
+
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+_owned = set()                         # names of blocks created here
+
+#===============================================================================
+# class Share
+#===============================================================================
+
+class Share:
+    """
+    class Share: copies a dict of named arrays into shared memory blocks and
+    carries picklable meta data. Pickling a Share transfers only meta data
+    and block names, so that worker processes attach to the same memory;
+    arrays() returns read-only views. The creating process owns the blocks
+    and unlinks them when serving ends (attached views must be released
+    before close() or unlink()).
+    >>> share = Share({'a':np.arange(3)},{'tag':'demo'})
+    >>> import pickle;  other = pickle.loads(pickle.dumps(share))
+    >>> a = other.arrays()['a'];  a.tolist(), a.flags.writeable, other.meta
+    ([0, 1, 2], False, {'tag': 'demo'})
+    >>> del a;  other.close();  share.unlink()
+    """
+    def __init__(self,arrays,meta=None):
+        self.meta = meta
+        self.spec = {}                 # tag -> (block name,shape,dtype)
+        self._blocks = {}
+        for tag,data in arrays.items():
+            data = np.ascontiguousarray(data)
+            block = shared_memory.SharedMemory(create=True,
+                                               size=max(1,data.nbytes))
+            np.ndarray(data.shape,data.dtype,buffer=block.buf)[...] = data
+            self.spec[tag] = (block.name,data.shape,data.dtype.str)
+            self._blocks[tag] = block;  _owned.add(block.name)
+
+    def __getstate__(self):
+        return {'meta':self.meta,'spec':self.spec}
+
+    def __setstate__(self,state):
+        self.meta = state['meta'];  self.spec = state['spec']
+        self._blocks = {}
+
+    def arrays(self):                  # read-only views of the shared arrays
+        arrays = {}
+        for tag,(name,shape,dtype) in self.spec.items():
+            if tag not in self._blocks:
+                self._blocks[tag] = _attach(name)
+            data = np.ndarray(shape,dtype,buffer=self._blocks[tag].buf)
+            data.flags.writeable = False
+            arrays[tag] = data
+        return arrays
+
+    def nbytes(self):
+        return sum(int(np.prod(shape))*np.dtype(dtype).itemsize
+                   for name,shape,dtype in self.spec.values())
+
+    def close(self):                   # detach from the shared blocks
+        for block in self._blocks.values():
+            block.close()
+        self._blocks = {}
+
+    def unlink(self):                  # free the shared blocks (owner)
+        self.close()
+        for name,shape,dtype in self.spec.values():
+            block = shared_memory.SharedMemory(name=name)
+            block.close();  block.unlink();  _owned.discard(name)
+
+    def __str__(self):
+        return 'Share(%s,%d bytes)' % (','.join(self.spec),self.nbytes())
+
+    def __repr__(self):
+        return self.__str__()
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def _attach(name):    # attach to a block whose lifetime is owned elsewhere
+    block = shared_memory.SharedMemory(name=name)
+    if name not in _owned:             # owner's resource tracker cleans up
+        resource_tracker.unregister(block._name,'shared_memory')
+    return block
+
+#===============================================================================
+# doc test
+#===============================================================================
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,401 @@
+"""
+module neurotron.cluster.sparse
+    class Sparse  # predictive terminal with sparse (CSR style) synapse store
+"""
+
+import numpy as np
+from neurotron.math import Matrix, Field
+from neurotron.cluster.setup import Predict
+from neurotron.cluster.terminal import Terminal, _file, _chunks
+from neurotron.math.backend import backend
+isa = isinstance
+
+#===============================================================================
+# class Sparse
+#===============================================================================
+
+class Sparse(Terminal):
+    """
+    class Sparse: predictive terminal which holds only the occupied segments
+    of a Predict setup. Segment j of the store belongs to cell cell[j] at
+    segment row row[j], with presynaptic indices idx[j,:] and permanences
+    perm[j,:]. Spikes are computed via a CSR index over presynaptic cells,
+    so only synapses of active presynaptic cells are visited.
+    >>> predict = Sparse(Predict(1,3,2,3,sparse=True))
+    >>> predict.connect([0,1,2],1)
+    True
+    >>> predict.map()
+    eta: 0.5 , theta: 3 , delta: (0.1, 0.1)
+    K: +-000/0-+-001/1-+-002/2-+
+       |  000  |  012  |  000  |
+       |  000  |  000  |  000  |
+       +-------+-------+-------+
+    P: +-000/0-+-001/1-+-002/2-+
+       |  000  |  AAA  |  000  |
+       |  000  |  000  |  000  |
+       +-------+-------+-------+
+    W: +-000/0-+-001/1-+-002/2-+
+       |  000  |  111  |  000  |
+       |  000  |  000  |  000  |
+       +-------+-------+-------+
+    >>> predict(Matrix([1,1,1]))
+    [0 1 0]
+    >>> predict.count
+    1
+    """
+    def __init__(self,setup,eta=None,theta=None,delta=None,verbose=0):
+        assert isa(setup,Predict)
+        self.eta = setup.eta if eta is None else eta
+        self.theta = setup.theta if theta is None else theta
+        self.delta = setup.delta if delta is None else delta
+        self.shape = setup.shape
+        self.verbose = verbose
+        self.updates = 0                   # counter of updated synapses
+        assert self.theta > 0
+        self.clear()
+        if setup.K is not None:            # import dense setup (e.g. random)
+            self._import(setup.K,setup.P)
+
+    def clear(self):
+        m,n,d,s = self.shape
+        cap = 16
+        self.count = 0                     # number of allocated segments
+        self.cell = np.zeros(cap,dtype=int)
+        self.row = np.zeros(cap,dtype=int)
+        self.idx = np.zeros((cap,s),dtype=int)
+        self.perm = np.zeros((cap,s))
+        self._w = np.zeros((cap,s),dtype=bool)
+        self.slot = -np.ones((m*n,d),dtype=np.int32)  # (k,ii) -> segment
+        self.free = [(1 << d) - 1 for k in range(m*n)] # free row bit masks
+        self.rows = {}                     # (k,idx) -> occupied row
+        self._csr = None                   # presynaptic index (lazy)
+        self._spk = np.zeros(0,dtype=int)  # spiking segments
+        self._inc = np.zeros((0,s))        # their learning increments
+        return self
+
+    def _import(self,K,P):
+        K = K.tensor();  P = P.tensor()
+        for k,ii in zip(*np.nonzero(P.any(axis=2))):
+            j = self._alloc(int(k),int(ii))
+            self.idx[j] = K[k,ii];  self.perm[j] = P[k,ii]
+            self._occupy(j)
+        self._w[:self.count] = self.perm[:self.count] >= self.eta
+
+    def _alloc(self,k,ii):            # segment j for row ii of cell k
+        j = self.slot[k,ii]
+        if j >= 0: return j            # re-use freed segment
+        if self.count == len(self.cell):
+            grow = lambda a: np.concatenate((a,np.zeros((max(len(a),16),)
+                                            + a.shape[1:],dtype=a.dtype)))
+            self.cell = grow(self.cell);  self.row = grow(self.row)
+            self.idx = grow(self.idx);  self.perm = grow(self.perm)
+            self._w = grow(self._w)
+        j = self.count;  self.count += 1
+        self.cell[j] = k;  self.row[j] = ii;  self.slot[k,ii] = j
+        self._csr = None
+        return j
+
+    def _occupy(self,j):              # mark segment j as occupied
+        k = int(self.cell[j]);  ii = int(self.row[j])
+        self.free[k] &= ~(1 << ii)
+        key = (k,tuple(self.idx[j]))
+        self.rows[key] = min(ii,self.rows.get(key,ii))
+
+    def _release(self,j):             # mark segment j as free
+        k = int(self.cell[j]);  ii = int(self.row[j])
+        self.free[k] |= 1 << ii
+        key = (k,tuple(self.idx[j]))
+        if self.rows.get(key) == ii:  # next occupied row with same indices
+            del self.rows[key]
+            for jj in self.slot[k]:
+                if jj >= 0 and not (self.free[k] >> int(self.row[jj])) & 1 \
+                   and tuple(self.idx[jj]) == key[1]:
+                    self.rows[key] = int(self.row[jj]);  break
+
+    def connect(self,idx,k):          # connect a free segment of cell k
+        """
+        >>> predict = Sparse(Predict(1,2,2,3,sparse=True))
+        >>> predict.connect([1,0,0],0), predict.connect([1,0,0],0)
+        (True, True)
+        >>> predict.connect([0,1,0],0), predict.connect([1,1,0],0)
+        (True, False)
+        >>> predict.K.map()
+        +-000/0-+-001/1-+
+        |  100  |  000  |
+        |  010  |  000  |
+        +-------+-------+
+        """
+        self._writable()
+        free = self.free[k]
+        first = (free & -free).bit_length() - 1     # lowest free row or -1
+        ii = self.rows.get((k,tuple(idx)))
+        if ii is not None and (first < 0 or ii < first):
+            return True                 # already connected
+        if first < 0:
+            return False                # no free segment
+        j = self._alloc(k,first)
+        self.idx[j] = idx;  self.perm[j] = 0.5
+        self._w[j] = self.perm[j] >= self.eta
+        self._occupy(j);  self._csr = None
+        return True
+
+    def connect_many(self,pairs):     # connect a list of (idx,kdx) pairs
+        failed = []
+        for nn,(idx,kdx) in enumerate(pairs):
+            for k in kdx:
+                if not self.connect(idx,k):
+                    failed.append((nn,k));  break
+        return failed
+
+    _store = ('cell','row','idx','perm','w','slot')  # see Terminal.save
+
+    def _data(self):                  # (clear() allocates a fresh store)
+        return self.slot
+
+    def store(self):
+        c = self.count
+        meta = dict(eta=self.eta,theta=self.theta,delta=self.delta,
+                    updates=self.updates)
+        arrays = dict(cell=self.cell[:c],row=self.row[:c],idx=self.idx[:c],
+                      perm=self.perm[:c],w=self._w[:c],slot=self.slot)
+        return meta,arrays
+
+    def restore(self,meta,arrays):
+        self.eta,self.theta = meta['eta'],meta['theta']
+        self.delta,self.updates = tuple(meta['delta']),meta['updates']
+        self.clear()
+        self.cell = arrays['cell'];  self.row = arrays['row']
+        self.idx = arrays['idx'];  self.perm = arrays['perm']
+        self._w = arrays['w'];  self.slot = arrays['slot']
+        self.count = len(self.cell)
+        for j in np.nonzero(self.perm.any(axis=1))[0]:
+            self._occupy(j)              # rebuild free masks and row hash
+        return self
+
+    def _presyn(self):                 # CSR index over presynaptic cells
+        if self._csr is None:
+            m,n,d,s = self.shape
+            pre = self.idx[:self.count].ravel()
+            order = np.argsort(pre,kind='stable')
+            N = max(m*n,int(pre.max())+1 if len(pre) else 0)
+            ptr = np.zeros(N+1,dtype=int)
+            np.cumsum(np.bincount(pre,minlength=N),out=ptr[1:])
+            self._csr = (ptr,order)
+        return self._csr
+
+    def _spike(self,v):               # spiking segments and their increments
+        m,n,d,s = self.shape
+        v = np.asarray(v).ravel(order='F')
+        ptr,order = self._presyn()
+        active = np.nonzero(v[:len(ptr)-1])[0]
+        lens = ptr[active+1] - ptr[active]
+        total = int(lens.sum())
+        start = np.repeat(ptr[active] - np.cumsum(lens) + lens,lens)
+        syn = order[start + np.arange(total)]     # flat synapse numbers
+        value = np.repeat(v[active],lens) * self._w.ravel()[syn]
+        sums = np.bincount(syn//s,weights=value,minlength=self.count)
+        spk = np.nonzero(backend().threshold(sums,self.theta))[0]
+        spk = spk[np.lexsort((self.row[spk],self.cell[spk]))]
+        pdelta,ndelta = self.delta
+        self._spk = spk
+        self._inc = 2*pdelta*v[self.idx[spk]] - ndelta
+        if self.verbose > 0:
+            for j,inc in zip(spk,self._inc):
+                if inc.any():
+                    print('mind I[%g].%g:' % (self.cell[j],self.row[j]),
+                          Matrix(inc))
+        return spk
+
+    def spike(self,v):
+        if not isa(v,Matrix): v = Matrix(v)
+        m,n,d,s = self.shape
+        spk = self._spike(v)
+        S = Field(m,n,1,d)
+        S.tensor()[self.cell[spk],0,self.row[spk]] = 1
+        return S
+
+    def learn(self,L):
+        self._writable()
+        L = np.asarray(L).ravel(order='F')
+        spk = self._spk[L[self.cell[self._spk]] != 0]
+        if len(spk) == 0: return 0
+        inc = self._inc[L[self.cell[self._spk]] != 0]
+        old = self.perm[spk];  be = backend()
+        new = be.clip(old + inc,0,1)
+        count = int(np.count_nonzero(new != old))
+        self.perm[spk] = new;  self._w[spk] = be.threshold(new,self.eta)
+        for j in spk[~new.any(axis=1)]:
+            self._release(j)
+        for j in spk[new.any(axis=1) & ~old.any(axis=1)]:
+            self._occupy(j)              # (increments set by I[k] = ...)
+        self.updates += count
+        if self.verbose > 0:
+            for j,i in zip(spk,inc):
+                if i.any():
+                    print('learn P[%g].%g:' % (self.cell[j],self.row[j]),
+                          Matrix(self.perm[j]),'by',Matrix(i))
+        return count
+
+    def invalidate(self,k=None):
+        pass
+
+    def refresh(self):
+        pass
+
+    def _field(self,data,tag=None):  # materialize dense field
+        m,n,d,s = self.shape
+        F = Field(m,n,d,s);  c = self.count
+        F.tensor()[self.cell[:c],self.row[:c]] = data[:c]
+        if tag is None:
+            F.data.flags.writeable = False     # derived data (e.g. W)
+        else:
+            F.observer = lambda k: self._write(tag,F,k)
+        return F
+
+    def _write(self,tag,F,k):        # write back cell k (None: all) of F
+        """
+        writes F[k] = ... into a materialized K, P or I are written back to
+        the store (as with a dense terminal); W is derived and read-only
+        >>> predict = Sparse(Predict(1,3,2,3,sparse=True))
+        >>> K = predict.K;  K[1] = Matrix([[0,1,2],[0,0,0]])
+        >>> P = predict.P;  P[1] = Matrix([[0.5,0.5,0.5],[0,0,0]])
+        >>> predict(Matrix([1,1,1])), predict.count, predict.free
+        ([0 1 0], 1, [3, 2, 3])
+        >>> I = predict.I;  I[1] = Matrix([[0.1,0.1,-0.5],[0,0,0]])
+        >>> predict.learn(Matrix([0,1,0])), predict.P[1]
+        (3, [0.6 0.6 0; 0 0 0])
+        >>> predict.W[1] = Matrix([[1,1,1],[0,0,0]])
+        Traceback (most recent call last):
+        ...
+        ValueError: assignment destination is read-only
+        """
+        self._writable()
+        m,n,d,s = self.shape
+        T = F.tensor()
+        for k in range(m*n) if k is None else [k]:
+            if tag == 'I':
+                self._increment(k,T[k])
+                continue
+            for ii in range(d):
+                j = self.slot[k,ii]
+                if j < 0 and not T[k,ii].any(): continue
+                j = self._alloc(k,ii)
+                if not (self.free[k] >> ii) & 1:
+                    self._release(j)
+                if tag == 'K':
+                    self.idx[j] = T[k,ii]
+                else:
+                    self.perm[j] = T[k,ii];  self._w[j] = T[k,ii] >= self.eta
+                if self.perm[j].any():
+                    self._occupy(j)
+        self._csr = None
+
+    def _increment(self,k,Ik):      # set learning increments of cell k
+        keep = self.cell[self._spk] != k
+        spk = [self._spk[keep]];  inc = [self._inc[keep]]
+        for ii in np.nonzero(Ik.any(axis=1))[0]:
+            spk.append([self._alloc(k,int(ii))]);  inc.append(Ik[ii:ii+1])
+        spk = np.concatenate(spk).astype(int);  order = np.argsort(spk)
+        self._spk = spk[order];  self._inc = np.concatenate(inc)[order]
+
+    def _getK(self):
+        return self._field(self.idx,'K')
+
+    def _getP(self):
+        P = self._field(self.perm,'P');  P.map = P.vmap
+        return P
+
+    def _getW(self):
+        return self._field(self._w)
+
+    def _getI(self):
+        m,n,d,s = self.shape
+        I = Field(m,n,d,s);  spk = self._spk
+        I.tensor()[self.cell[spk],self.row[spk]] = self._inc
+        I.observer = lambda k: self._write('I',I,k)
+        return I
+
+    def weight(self):
+        return self.W
+
+    def empower(self,v):
+        m,n,d,s = self.shape
+        v = np.asarray(v if isa(v,Matrix) else Matrix(v)).ravel(order='F')
+        c = self.count
+        E = np.zeros((c,s));  E[:] = v[self.idx[:c]] * self._w[:c]
+        return self._field(E)
+
+    def __call__(self,v):
+        if not isa(v,Matrix): v = Matrix(v)
+        m,n,d,s = self.shape
+        J = np.zeros(m*n)
+        J[self.cell[self._spike(v)]] = 1
+        return Matrix(J.reshape((m,n),order='F'))
+
+    def batch(self,V):
+        m,n,d,s = self.shape
+        V = np.asarray(V);  c = self.count
+        J = np.zeros((len(V),m*n),dtype=bool)
+        rows = [np.nonzero(self.row[:c] == ii)[0] for ii in range(d)]
+        for b in _chunks(len(V),c*s):
+            spk = (V[b,self.idx[:c]] * self._w[:c]).sum(axis=2) >= self.theta
+            for j in rows:          # cells are unique within a segment row
+                J[b,self.cell[j]] |= spk[:,j]
+        return J
+
+    K = property(fget=_getK)
+    P = property(fget=_getP)
+    W = property(fget=_getW)
+    I = property(fget=_getI)
+
+#===============================================================================
+# unit tests
+#===============================================================================
+
+def _test_parity():
+    """
+    sparse and dense cluster produce identical results
+    >>> from neurotron.cluster.cells import Cluster
+    >>> import neurotron.math as nm
+    >>> def run(sparse):
+    ...     nm.seed(3);  cells = Cluster(3,6,3,3,rand=True,sparse=sparse)
+    ...     out = []
+    ...     for t in range(20):
+    ...         y = cells.iterate(cells.embed(nm.rand((1,6),2)))
+    ...         out.append((y.list(),cells.X.list()))
+    ...     return out,cells._predict.P.flat().list()
+    >>> run(False) == run(True)
+    True
+    """
+
+def _test_mary():
+    """
+    >>> from neurotron.cluster.cells import Cells
+    >>> from neurotron.cluster.trainer import Trainer
+    >>> train = Trainer(cells:=Cells((2,9,8,3),3,sparse=True))
+    >>> train('Mary likes to sing')
+    '<Mary likes to sing>'
+    >>> cells.run('Mary',...)
+    ['Mary', '->', 'likes', 'to', 'sing', '']
+    >>> cells._predict.count
+    9
+    """
+
+def _test_snapshot():
+    """
+    >>> import tempfile;  path = tempfile.mkdtemp()
+    >>> predict = Sparse(Predict(1,3,2,3,sparse=True))
+    >>> predict.connect([0,1,2],1)
+    True
+    >>> predict.save(path);  loaded = Sparse(Predict(1,3,2,3)).load(path)
+    >>> loaded(Matrix([1,1,1])), loaded.count, loaded.free
+    ([0 1 0], 1, [3, 2, 3])
+    """
+
+#===============================================================================
+# doc test
+#===============================================================================
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
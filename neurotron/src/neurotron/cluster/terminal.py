@@ -3,9 +3,12 @@ neurotron.cluster.terminal.py:
     class Terminal
 """
 
+import os
+import numpy as np
 from neurotron.math import Attribute, Matrix, Field
 from neurotron.cluster.setup import Setup, Plain, Collab, Excite, Predict
 from neurotron.math.helper import isa
+from neurotron.math.backend import backend
 import neurotron.math as nm
 
 #===============================================================================
@@ -51,6 +54,18 @@ class Terminal(Attribute):
             self.I = Field(*self.K.shape)  #  learning increment
         else:
             self.I = None
+        self.updates = 0                   # counter of updated synapses
+
+            # weights W and integer synapse indices are cached per cell;
+            # writes to K or P invalidate the affected cells
+
+        if self.K is not None:
+            m,n,d,s = self.K.shape
+            self._index = np.zeros((m*n,d,s),dtype=int)
+            self._dirty = np.ones(m*n,dtype=bool)
+            self.K.observer = self.invalidate
+            if self.P is not None:
+                self.P.observer = self.invalidate
 
     def map(self):
         print('eta:',self.eta,', theta:',self.theta,', delta:',self.delta)
@@ -67,82 +82,213 @@ class Terminal(Attribute):
         else:
             self.W.map('W: ')
 
-    def weight(self):
+    def invalidate(self,k=None):    # invalidate cached weights of cell(s) k
+        """
+        >>> predict = Terminal(Predict(1,3,1,3)); predict.weight().map()
+        +-000/0-+-001/1-+-002/2-+
+        |  000  |  000  |  000  |
+        +-------+-------+-------+
+        >>> predict.P[1] = Matrix([[0.5,0.4,0.6]])   # invalidates cell 1
+        >>> predict.P[2][0,0] = 0.9;  predict.invalidate(2)
+        >>> predict.weight().map()
+        +-000/0-+-001/1-+-002/2-+
+        |  000  |  101  |  100  |
+        +-------+-------+-------+
+        """
+        if k is None:
+            self._dirty[:] = True
+        else:
+            self._dirty[k] = True
+
+    def refresh(self):              # refresh cache of invalidated cells
+        if not self._dirty.any(): return
+        k = np.nonzero(self._dirty)[0]
+        self._index[k] = self.K.tensor()[k]
         if self.P is not None:
-            m,n,d,s = self.K.shape
-            for k in range(m*n):
-                self.W[k] = self.P[k] >= self.eta
+            self.W.tensor()[k] = backend().threshold(self.P.tensor()[k],
+                                                     self.eta)
+        self._dirty[k] = False
+
+    def weight(self):
+        self.refresh()
         return self.W
 
+    def _gather(self,v):            # presynaptic values of all synapses
+        """
+        V[k,ii,jj] = v[K[k][ii,jj]] for all cells k (linear index order)
+        >>> collab = Terminal(Collab(2,3,2,5))
+        >>> collab._gather(Matrix([1,0,0,0,1,1])).shape
+        (6, 1, 1)
+        >>> collab._gather(Matrix([1,0,0,0,1,1]))[:,0,0]
+        array([0, 1, 0, 0, 1, 1])
+        """
+        self.refresh()
+        v = np.asarray(v).ravel(order='F')
+        return backend().gather(v,self._index)
+
     def empower(self,v):
-        m,n,d,s = self.K.shape
-        E = Field(m,n,d,s)
-        self.weight()               # refresh weight
-        for k in range(m*n):
-            V = v[self.K[k]]
-            E[k] = V * self.W[k]
+        if not isa(v,Matrix): v = Matrix(v)
+        E = Field(*self.K.shape)
+        self.refresh()              # refresh weight
+        E.tensor()[...] = self._gather(v) * self.W.tensor()
         return E
 
     def _simple(self,v):            # simple spiking
         if not isa(v,Matrix): v = Matrix(v)
         S = Matrix(*self.shape)
         m,n = self.shape
-        for j in range(min(n,v.shape[1])):
-            for i in range(m):
-                s = (v[j] > 0);  S[i,j] = s
+        v = np.asarray(v).ravel(order='F')[:n]
+        S[:,:len(v)] = v > 0
         return S
 
-    def mind(self,sk,V,k):
-        def log(I,k):
-            d,s = I.shape
-            for ii in range(d):
-                if nm.any(I[ii,:]):
-                    print('mind I[%g].%g:' % (k,ii), I[ii,:])
-        m,n,d,s = self.P.shape
+    def mind(self,S,V):             # learning increments of all cells
+        """
+        I[k][ii,:] = 2*pdelta*V[k][ii,:] - ndelta for each spiking segment
+        ii of cell k (S[k,ii] != 0), otherwise zero
+        """
+        def log(I):
+            for k,ii in zip(*np.nonzero(I.any(axis=2))):
+                k = int(k);  ii = int(ii)
+                print('mind I[%g].%g:' % (k,ii), self.I[k][ii,:])
         pdelta,ndelta = self.delta
-        S = sk.T @ nm.ones(1,s)
-        I = S * (2*pdelta*V - ndelta)
-        if self.verbose > 0: log(I,k)
-        #if any(sk):
-        #    print('##### mind V:',V)
-        #    print('#####      S:',S)
-        #    print('#####      I:',I)
+        I = S[:,:,None] * (2*pdelta*V - ndelta)
+        if self.verbose > 0:
+            self.I.tensor()[...] = I;  log(I)
         return I
 
-    def learn(self,L):
+    def learn(self,L):              # learn all cells with L[k] != 0
+        """
+        >>> predict = Terminal(Predict(1,3,1,3))
+        >>> predict.P[0] = predict.P[2] = Matrix([[0.5,0.95,0.05]])
+        >>> predict.I[0] = predict.I[2] = Matrix([[0.1,0.1,-0.1]])
+        >>> predict.learn(Matrix([[1,0,0]]))
+        3
+        >>> predict.P.map(); predict.W.map()
+        +-000/0-+-001/1-+-002/2-+
+        |  E10  |  000  |  AWw  |
+        +-------+-------+-------+
+        +-000/0-+-001/1-+-002/2-+
+        |  110  |  000  |  000  |
+        +-------+-------+-------+
+        >>> predict.updates
+        3
+        """
         def log(P,I,k):
             m,n,d,s = P.shape
             for ii in range(d):
                 if nm.any(I[k][ii,:]):
                     Pii = P[k][ii,:];  Iii = I[k][ii,:]
                     print('learn P[%g].%g:' % (k,ii),Pii,'by',Iii)
-        for k in self.P.range():
-            if L[k]:
-                self.P[k] = nm.max(0,nm.min(1,self.P[k]+self.I[k]))
-                if self.verbose > 0:
-                    log(self.P,self.I,k)
+        self._writable()
+        k = np.nonzero(np.asarray(L).ravel(order='F'))[0]
+        if len(k) == 0: return 0
+        P = self.P.tensor();  I = self.I.tensor();  be = backend()
+        Pk = be.clip(be.masked_add(P,I,k),0,1)
+        count = int(np.count_nonzero(Pk != P[k]))
+        P[k] = Pk;  self.W.tensor()[k] = be.threshold(Pk,self.eta)
+        self.updates += count
+        if self.verbose > 0:
+            for kk in k: log(self.P,self.I,int(kk))
+        return count
 
     def spike(self,v):              # calculate spike vectors
         if not isa(v,Matrix): v = Matrix(v)
         if self.K is None:
             J = self._simple(v)
             S = Field(*self.shape,1,1)
-            for k in S.range(): S[k] = J[k]
+            S.tensor()[:,0,0] = np.asarray(J).ravel(order='F')
             return S
         m,n,d,s = self.K.shape
         if d*s == 0:
             return 0
         S = Field(m,n,1,d)
-        self.weight()               # refresh weight
-        for k in range(m*n):
-            V = v[self.K[k]]
-            E = V * self.W[k]
-            #print('nm.sum(E.T) >= self.theta:',E,nm.sum(E.T),self.theta)
-            S[k] = nm.sum(E.T) >= self.theta
-            if self.I is not None:
-                self.I[k] = self.mind(S[k],V,k)
+        self.refresh()              # refresh weight
+        V = self._gather(v)         # (m*n,d,s) presynaptic values
+        E = V * self.W.tensor()     # empowerment
+        be = backend()
+        Sk = be.threshold(be.reduce(E),self.theta)
+        S.tensor()[:,0,:] = Sk
+        if self.I is not None:
+            self.I.tensor()[...] = self.mind(Sk,V)
         return S
 
+    def connect(self,idx,k):        # connect free segment of cell k to idx
+        """
+        connect the first free segment (all permanences zero) of cell k to
+        presynaptic indices idx, unless a segment preceding it is already
+        connected to idx; returns False if no free segment is left
+        >>> predict = Terminal(Predict(1,2,2,3))
+        >>> predict.connect([1,0,0],0), predict.connect([1,0,0],0)
+        (True, True)
+        >>> predict.connect([0,1,0],0), predict.connect([1,1,0],0)
+        (True, False)
+        >>> predict.K.map()
+        +-000/0-+-001/1-+
+        |  100  |  000  |
+        |  010  |  000  |
+        +-------+-------+
+        """
+        self._writable()
+        m,n,d,s = self.K.shape
+        K = self.K.tensor()[k];  P = self.P.tensor()[k]
+        for ii in range(d):
+            if not P[ii].any():
+                K[ii] = 0;  K[ii,:len(idx)] = idx;  P[ii,:len(idx)] = 0.5
+                self.invalidate(k)
+                return True
+            elif (K[ii] == idx).all():
+                return True
+        return False
+
+    def connect_many(self,pairs):   # connect a list of (idx,kdx) pairs
+        """
+        connect every target cell k in kdx to presynaptic indices idx for
+        all pairs (idx,kdx) in order, with the same outcome as a sequence of
+        connect() calls; free segments are tracked by a bit mask per cell,
+        connected segments by a hash. Returns the failed (n,k), n being the
+        pair number (further targets of a failed pair are skipped)
+        >>> predict = Terminal(Predict(1,3,2,3))
+        >>> pairs = [([1,0,0],[0,2]),([1,0,0],[0]),([0,1,0],[0]),([1,2,0],[0,1])]
+        >>> predict.connect_many(pairs)
+        [(3, 0)]
+        >>> predict.K.map()
+        +-000/0-+-001/1-+-002/2-+
+        |  100  |  000  |  100  |
+        |  010  |  000  |  000  |
+        +-------+-------+-------+
+        """
+        self._writable()
+        m,n,d,s = self.K.shape
+        K = self.K.tensor();  P = self.P.tensor()
+        cells = sorted({k for idx,kdx in pairs for k in kdx})
+        free = {};  rows = {}
+        for k,used in zip(cells,P[cells].any(axis=2)):
+            free[k] = sum(1 << ii for ii in range(d) if not used[ii])
+            for ii in np.nonzero(used)[0][::-1]:
+                rows[(k,tuple(K[k,ii]))] = int(ii)
+
+        writes = [];  failed = []
+        for nn,(idx,kdx) in enumerate(pairs):
+            key = tuple(idx) + (0,)*(s-len(idx))
+            for k in kdx:
+                f = free[k]
+                first = (f & -f).bit_length() - 1     # lowest free row or -1
+                ii = rows.get((k,key))
+                if ii is not None and (first < 0 or ii < first):
+                    continue                          # already connected
+                if first < 0:
+                    failed.append((nn,k));  break     # no free segment
+                free[k] = f & ~(1 << first)
+                rows[(k,key)] = first if ii is None else min(ii,first)
+                writes.append((k,first,key,len(idx)))
+
+        if writes:
+            k,ii,key,length = [np.array(x) for x in zip(*writes)]
+            K[k,ii] = key
+            P[k,ii] = 0.5 * (np.arange(s) < length[:,None])
+            self.invalidate(k)
+        return failed
+
     def clear(self):
         """
         >>> predict = Terminal(Predict(1,3,2,5,rand=True))
@@ -175,12 +321,76 @@ class Terminal(Attribute):
            | 00000 | 00000 | 00000 |
            +-------+-------+-------+
         """
-        m,n,d,s = self.K.shape
-        zero = nm.zeros(d,s)
-        for k in self.K.range():
-            self.K[k] = self.W[k] = zero
-            if self.P is not None:
-                self.P[k] = zero
+        self._writable()
+        self.K.data.fill(0);  self.W.data.fill(0);  self._index.fill(0)
+        if self.P is not None:
+            self.P.data.fill(0)
+        self._dirty[:] = False
+        return self
+
+    def save(self,path,name='predict'):  # save synapse tensors to directory
+        """
+        save K,P,W (and the integer index cache) as raw .npy arrays, which
+        load() maps read-only by default (mmap=False loads writable copies)
+        >>> import tempfile;  path = tempfile.mkdtemp()
+        >>> predict = Terminal(Predict(1,3,2,3))
+        >>> predict.connect([1,2,0],1)
+        True
+        >>> predict.save(path)
+        >>> loaded = Terminal(Predict(1,3,2,3)).load(path);  loaded.W.map()
+        +-000/0-+-001/1-+-002/2-+
+        |  000  |  111  |  000  |
+        |  000  |  000  |  000  |
+        +-------+-------+-------+
+        >>> loaded(Matrix([1,1,1])), loaded.P.data.flags.writeable
+        ([0 1 0], False)
+        >>> loaded.clear()
+        Traceback (most recent call last):
+        ...
+        Exception: read-only synapse store (load with mmap=False to modify)
+        """
+        meta,arrays = self.store()
+        np.savez(_file(path,name,'npz'),**meta)
+        for tag,data in arrays.items():
+            np.save(_file(path,name,tag+'.npy'),data)
+
+    def load(self,path,name='predict',mmap=True):
+        mode = 'r' if mmap else None
+        with np.load(_file(path,name,'npz')) as data:
+            meta = {key:_value(data[key]) for key in data.files}
+        arrays = {tag:np.load(_file(path,name,tag+'.npy'),mmap_mode=mode)
+                  for tag in self._store}
+        return self.restore(meta,arrays)
+
+    _store = ('K','P','W','index')     # arrays of the synapse store
+
+    def _writable(self):            # raise unless synapse store is writable
+        if not self._data().flags.writeable:
+            raise Exception('read-only synapse store '
+                            '(load with mmap=False to modify)')
+
+    def _data(self):                # array of the synapse store to modify
+        return self.K.data
+
+    def store(self):                # parameters and arrays of synapse store
+        self.refresh()
+        meta = dict(eta=self.eta,theta=self.theta,delta=self.delta,
+                    updates=self.updates)
+        arrays = {tag:getattr(self,tag).data.transpose(1,0,2,3)
+                  for tag in 'KPW'}
+        arrays['index'] = self._index
+        return meta,arrays
+
+    def restore(self,meta,arrays):  # adopt synapse store arrays (no copy)
+        self.eta,self.theta = meta['eta'],meta['theta']
+        self.delta,self.updates = tuple(meta['delta']),meta['updates']
+        for tag in 'KPW':
+            setattr(self,tag,Field(arrays[tag].transpose(1,0,2,3)))
+        self._index = arrays['index']
+        self._dirty = np.zeros(len(self._index),dtype=bool)
+        self.K.observer = self.P.observer = self.invalidate
+        if self.I is None or self.I.shape != self.K.shape:
+            self.I = Field(*self.K.shape)
         return self
 
     def __call__(self,v):
@@ -190,11 +400,59 @@ class Terminal(Attribute):
         if d*s == 0: return Matrix(m,n)
 
         S = self.spike(v)
-        J = Matrix(*S.shape[:2])
-        for k in J.range():
-            J[k] = max(S[k])
+        J = S.tensor().max(axis=(1,2))
+        return Matrix(J.reshape((m,n),order='F'))
+
+    def batch(self,V):              # spikes for a batch of input vectors
+        """
+        J[b,k] = 1 if cell k spikes for (linear indexed) input V[b,:],
+        no learning increments are calculated
+        >>> excite = Terminal(Plain(2,3))
+        >>> excite.batch(np.array([[1,0,1],[0,1,0]])).astype(int)
+        array([[1, 1, 0, 0, 1, 1],
+               [0, 0, 1, 1, 0, 0]])
+        >>> collab = Terminal(Collab(2,3,2,5))
+        >>> collab(Matrix([1,0,0,0,1,1]))
+        [0 0 1; 1 0 1]
+        >>> collab.batch(np.array([[1,0,0,0,1,1]])).astype(int)
+        array([[0, 1, 0, 0, 1, 1]])
+        """
+        V = np.asarray(V)
+        if self.K is None:
+            m,n = self.shape
+            j = np.arange(m*n) // m;  ok = j < min(n,V.shape[1])
+            J = np.zeros((len(V),m*n),dtype=bool)
+            J[:,ok] = V[:,j[ok]] > 0
+            return J
+        m,n,d,s = self.K.shape
+        if d*s == 0:
+            return np.zeros((len(V),m*n),dtype=bool)
+        self.refresh()
+        W = self.W.tensor();  be = backend()
+        J = np.zeros((len(V),m*n),dtype=bool)
+        for b in _chunks(len(V),m*n*d*s):
+            E = V[b,self._index] * W    # (b,m*n,d,s) empowerment
+            J[b] = be.threshold(be.reduce(E),self.theta).any(axis=2)
         return J
 
+#===============================================================================
+# helper
+#===============================================================================
+
+def _file(path,name,ext):       # file name of a snapshot component
+    return os.path.join(path,'%s.%s' % (name,ext))
+
+def _value(a):                  # python value of a loaded meta data array
+    return a.item() if a.ndim == 0 else tuple(a.tolist())
+
+def _chunks(B,size,budget=1<<22):   # batch slices of at most budget elements
+    """
+    >>> _chunks(5,1<<21)
+    [slice(0, 2, None), slice(2, 4, None), slice(4, 6, None)]
+    """
+    step = max(1,budget//max(1,size))
+    return [slice(b,b+step) for b in range(0,B,step)]
+
 #===============================================================================
 # unit tests
 #===============================================================================
@@ -3,9 +3,12 @@ module neurotron.cluster.token
     class Token  # deal with tokens
 """
 
+import os
+import re
+import mmap
+import numpy as np
 from neurotron.math.matrix import Matrix
 from neurotron.math.matfun import SEED as seed, RAND as rand
-import neurotron.math.matfun as mf
 isa = isinstance
 
 #=========================================================================
@@ -25,8 +28,8 @@ class Token(dict):
     (2, 2)
     >>> token.shape
     (1, 4)
-    >>> new = token('new'); token
-    Token({'.': [0, 0, 1, 1],'new': [0, 1, 0, 1]})
+    >>> seed(0); new = token('new'); token
+    Token({'.': [0, 0, 1, 1],'new': [0, 1, 1, 0]})
     >>> token.shape
     (2, 4)
     >>> token.null()
@@ -50,19 +53,53 @@ class Token(dict):
         for item in list: str += '1' if item else '0'
         return str
 
+    def pack(self,bits):
+        """
+        pack bit list into an int (bit k = bits[k], sentinel bit len(bits))
+        >>> Token().pack([1,0,1,0]), Token().pack([1,0,1])
+        (21, 13)
+        """
+        v = np.append(np.asarray(bits).ravel() != 0,True)
+        return int.from_bytes(np.packbits(v,bitorder='little').tobytes(),
+                              'little')
+
+    def unpack(self,code):
+        """
+        >>> Token().unpack(21)
+        '1010'
+        """
+        return ''.join('1' if code >> k & 1 else '0'
+                       for k in range(code.bit_length()-1))
+
     def pimp(self,terminal):
         for key in self:
-            code = self.pattern(terminal(self[key]))
+            code = self.pack([item for item in terminal(self[key])])
             self._decoder[code] = key
             #print('key:',key,'code:',code)
 
+    def __setitem__(self,key,bits):
+        if key in self: self._patterns = None  # pattern set gets stale
+        elif self._patterns is not None: self._patterns.add(self.pack(bits))
+        super().__setitem__(key,bits)
+        self._bits = None             # invalidate bit matrices
+
+    def _matrix(self,n):       # keys and (vocab,n) bit matrix of n-bit tokens
+        if self._bits is None:
+            groups = {}
+            for key in self:
+                groups.setdefault(len(self[key]),[]).append(key)
+            self._bits = {k:(keys,np.array([self[key] for key in keys]) != 0)
+                          for k,keys in groups.items()}
+        return self._bits.get(n,([],None))
+
     def _init(self):
-        self._decoder = {}  # inverse map's dictionary
+        self._decoder = {}  # inverse map: packed bits -> key
+        self._bits = None   # bit matrices by token length (lazy)
+        self._patterns = None  # hash set of packed token patterns (lazy)
         low = 999999999; high = -1
         for key in self:
             bits = self[key]
-            pat = self.pattern(bits)
-            self._decoder[pat] = key
+            self._decoder[self.pack(bits)] = key
             n = sum(bits)
             low = min(low,n);  high = max(high,n)
         self.range = (low,high)
@@ -106,85 +143,116 @@ class Token(dict):
         """
         decoder = self._decoder
         if arg is None:
-            return decoder
+            return {self.unpack(code):decoder[code] for code in decoder}
         elif isa(arg,list):
-            key = self.pattern(arg)
-            return decoder[key] if key in decoder else self._multi(arg)
+            row = np.asarray(arg) != 0
         elif isa(arg,Matrix):
-            #print('arg:',arg)
-            if arg.shape[0] > 1:
-                arg = mf.MAX(arg)
-            row = arg.list()[0]
-            key = self.pattern(row)
-            #print('### decoder:',decoder)
-            #print('###  row:',row,'key:',key,'in decoder:',key in decoder)
-            return decoder[key] if key in decoder else self._multi(row)
+            row = np.asarray(arg) != 0
+            row = row.any(axis=0) if row.shape[0] > 1 else row[0]
         else:
             return ''
+        key = decoder.get(self.pack(row))
+        return key if key is not None else self._multi(row)
 
-    def _multi(self,row):
-        row = Matrix(row)
-        result = []
-        for key in self:
-            pattern = Matrix(self[key])
-            #print('### row:',row,'pattern:',pattern)
-            if row.shape == pattern.shape:
-                match = mf.AND(row,pattern)
-                if all(match==pattern):
-                    result.append(key)
+    def _multi(self,row):      # all tokens contained in row
+        """
+        >>> Token({'a':[1,0,0],'b':[0,1,1],'c':[1,1,0]})._multi([1,1,1])
+        ['a', 'b', 'c']
+        """
+        row = np.asarray(row).ravel() != 0
+        keys,bits = self._matrix(len(row))
+        if bits is None: return ''
+        match = ~(bits & ~row).any(axis=1)
+        result = [keys[k] for k in np.nonzero(match)[0]]
         if len(result) == 1: result = result[0]
         return result if result != [] else ''
 
+    def _codes(self):         # hash set of packed token patterns (lazy)
+        if self._patterns is None:
+            self._patterns = {self.pack(self[key]) for key in self}
+        return self._patterns
+
+    def _sample(self,N,n):    # N random n-bit patterns with low..high bits
+        low,high = self.range
+        count = np.full((N,1),low) if low == high else \
+                low + np.random.randint(1+high-low,size=(N,1))
+        R = np.random.rand(N,n)   # set bits at the count largest draws
+        return R >= np.take_along_axis(np.sort(R,axis=1),n-count,axis=1)
+
     def upgrade(self,word):
         """
         >>> token = Token({'word1':[0,1,0,1],'word2':[1,0,1,0]})
         >>> seed(0); token.upgrade('word3')
-        [1, 0, 0, 1]
+        [0, 1, 1, 0]
         >>> token.shape
         (3, 4)
         """
+        return self.upgrade_many([word])[0]
+
+    def upgrade_many(self,words):
+        """
+        add new random tokens for a list of words (existing words are kept)
+        >>> token = Token().create(2,6)
+        >>> seed(0); new = token.upgrade_many(['a','b','.','a']);  new[:2]
+        [[0, 1, 0, 0, 0, 1], [0, 1, 1, 0, 0, 0]]
+        >>> new[2] == token['.'], new[3] == new[0]
+        (True, True)
+        >>> token.shape, len(token.decode())
+        ((3, 6), 3)
+        """
         if len(self) == 0: raise Exception('cannot upgrade empty tokenizer')
         key = next(iter(self))        # 1st key
         n = len(self[key])
-        zero = [0 for k in range(n)]  # zero token
-        low,high = self.range
+        codes = self._codes()
+        pending = list(dict.fromkeys(w for w in words if w not in self))
 
         for k in range(100000):       # max 100000 trials
-            m = low + rand(1+high-low)
-            pattern = zero.copy()
-            count = 0
-            while count < m:          # while not all m bits set
-                idx = rand(n)
-                if pattern[idx] == 0:
-                    pattern[idx] = 1
-                    count += 1
-
-                # is this a new pattern?
-
-            found = False
-            for key in self:
-                if self[key] == pattern:
-                    found = True
-                    break
-
-            if not found:     # cool - we found a new pattern
-                self[word] = pattern
-
-                pat = self.pattern(pattern)
-                self._decoder[pat] = word  # refresh decoder
-                #print('### update _decoder:',self._decoder)
-
-                m,n = self.shape
-                self.shape = (m+1,n)
-                return pattern
-        raise Exception('gave up after 100k trials')
+            if not pending: break
+            bits = self._sample(len(pending),n)
+            left = []
+            for word,row in zip(pending,bits):
+                code = self.pack(row)
+                if code in codes:     # not a new pattern, try again
+                    left.append(word);  continue
+                pattern = row.astype(int).tolist()
+                dict.__setitem__(self,word,pattern)
+                codes.add(code);  self._decoder[code] = word
+            pending = left
+
+        self._bits = None             # invalidate bit matrices
+        self.shape = (len(self),n)
+        if pending:
+            raise Exception('gave up after 100k trials')
+        return [self[word] for word in words]
+
+    def save(self,file):      # save vocabulary (words and packed bits)
+        """
+        >>> import io;  file = io.BytesIO()
+        >>> Token({'word1':[0,1,0],'word2':[1,0,1]}).save(file)
+        >>> _ = file.seek(0);  Token.load(file)
+        Token({'word1': [0, 1, 0],'word2': [1, 0, 1]})
+        """
+        words = list(self);  n = self.shape[1]
+        bits = np.array([self[word] for word in words],dtype=bool)
+        np.savez_compressed(file,words=np.array(words,dtype=str),n=n,
+                            bits=np.packbits(bits.reshape(-1,n),axis=1),
+                            autopimp=self.autopimp)
+
+    @classmethod
+    def load(cls,file):
+        with np.load(file) as data:
+            n = data['n'].item()
+            bits = np.unpackbits(data['bits'],axis=1,count=n).astype(int)
+            token = cls(zip(data['words'].tolist(),bits.tolist()))
+            token.autopimp = bool(data['autopimp'])
+        return token
 
     def __call__(self,word):
         """
         return token pattern (with auto-upgrade)
         >>> token = Token({'word1':[0,1,0,1],'word2':[1,0,1,0]})
         >>> seed(0); token('word3')
-        [1, 0, 0, 1]
+        [0, 1, 1, 0]
         """
         if word in self: return self[word]
         return self.upgrade(word)          # upgrade if not found
@@ -208,7 +276,7 @@ class Token(dict):
 
 class Text:
     """
-    access splitted text:
+    access splitted text (half-overlapping chunks of length n):
     >>> text = Text('The quick brown fox jumps over the lazy dog',8); text
     Text(12,8,['The quic','quick br','k brown ',...])
     >>> text[2]
@@ -217,51 +285,147 @@ class Text:
     ['k', ' ', 'b', 'r', 'o', 'w', 'n', ' ']
     >>> text.shape
     (12, 8)
+
+    chunks are computed on demand from their offsets; besides strings a text
+    can be a file path (memory-mapped until close(), also as a context
+    manager) or a bytes-like object (e.g. mmap)
+    >>> import pathlib, tempfile
+    >>> path = pathlib.Path(tempfile.mkdtemp()) / 'fox.txt'
+    >>> _ = path.write_bytes(b'\\n The quick brown\\nfox jumps')
+    >>> with Text(path,8) as text: text
+    Text(8,8,['The quic','quick br','k brown ',...])
+    >>> text = Text(path,8);  text[-2:]
+    ['s       ', '        ']
+    >>> [chunk for chunk in text][4]
+    'fox jump'
+    >>> text.close()
+
+    UTF-8 byte texts with multi-byte characters are not decoded up front:
+    one streaming pass records the byte offset of every 4096th character,
+    from which chunks are located and decoded on demand
+    >>> _ = path.write_bytes('\\n Grüße aus Köln\\nam Rhein'.encode())
+    >>> with Text(path,8) as text: text[:4], text.size
+    (['Grüße au', 'e aus Kö', 's Köln a', 'ln am Rh'], 23)
     """
     def __init__(self,text=None,n=None):  # split in m chunks of length n
+        self._mmap = None               # file mapping opened by Text
         if text is None or n is None:
             return
-        self.chunks = self._split(text,n)
-        self.shape = (len(self.chunks),n)
+        if isa(text,os.PathLike):
+            text = self._map(text)
+        self.index = None               # byte offsets of every STEP-th char
+        if isa(text,str):
+            self.data = self.refine(text);  self.offset = 0
+            length = len(self.data)
+        else:                           # bytes-like, e.g. mmap
+            self.data = text
+            self.offset,length,self.index = self._skip(text)
+        self.size = length - self.offset            # refined text length
+        self.shape = (2*(self.size//n+1),n)
+
+    STEP = 4096                         # char step of the byte offset index
+
+    def _map(self,path):       # memory-map a file
+        with open(path,'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0: return b''
+            self._mmap = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+            return self._mmap
+
+    def close(self):           # close the file mapping (if opened by Text)
+        if self._mmap is not None:
+            self._mmap.close();  self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def _skip(self,data):      # leading blanks, char length, offset index
+        head = re.search(rb'[^\n ]',data)
+        head = head.start() if head else len(data)
+        if not re.search(rb'[\x80-\xff]',data):   # ASCII: chars = bytes
+            return head,len(data),None
+        index = [];  chars = 0;  block = 1 << 24  # one streaming pass
+        for b in range(0,len(data),block):
+            a = np.frombuffer(data[b:b+block],dtype=np.uint8)
+            starts = np.flatnonzero((a & 0xC0) != 0x80)   # char starts
+            index.append(b + starts[(-chars) % self.STEP::self.STEP])
+            chars += len(starts)
+        return head,chars,np.concatenate(index)
+
+    def _byte(self,c):         # byte offset of char c of a byte text
+        if self.index is None: return c
+        k = c // self.STEP;  r = c - k*self.STEP
+        if k >= len(self.index): return len(self.data)
+        p = int(self.index[k])
+        while r > 0:               # skip r chars (at most 4 bytes each)
+            a = np.frombuffer(self.data[p:p+4*r],dtype=np.uint8)
+            starts = np.flatnonzero((a & 0xC0) != 0x80)
+            if r < len(starts): return p + int(starts[r])
+            if len(a) < 4*r: return len(self.data)
+            p += len(a);  r -= len(starts)
+        return p
 
     def refine(self,raw):  # remove newline characters
-        text = ''
-        while len(raw) > 0 and (raw[0] == '\n' or raw[0] == ' '):
-            raw = raw[1:]
-        for c in raw:
-            text += c if c != '\n' else ' '
-        return text
-
-    def _split(self,text,n):  # first refine then split text
-        text = self.refine(text)
-        chunks = [];  N = len(text)
-        blank = ''.join(' ' for i in range(n))
-
-        off = n//2
-        for k in range(len(text)//n+1):
-            chunk = text[k*n:min(k*n+n,N)]
-            if len(chunk) < n: chunk += blank[:n-len(chunk)]
-            chunks.append(chunk)
-
-            chunk = text[k*n+off:min(k*n+off+n,N)]
-            if len(chunk) < n: chunk += blank[:n-len(chunk)]
-            chunks.append(chunk)
-        return chunks
+        """
+        >>> Text().refine('\\n  To be,\\nor not')
+        'To be, or not'
+        """
+        return raw.lstrip('\n ').replace('\n',' ')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __iter__(self):        # generate chunks
+        for idx in range(self.shape[0]):
+            yield self._chunk(idx)
+
+    def spans(self):           # generate non-overlapping word-aligned spans
+        """
+        the even chunks tile the text; spans are cut at their last blank,
+        so that no word is split and no text is repeated
+        >>> list(Text('Mary likes to sing John likes to dance',20).spans())
+        ['Mary likes to sing', 'John likes to dance']
+        """
+        rest = ''
+        for idx in range(0,self.shape[0],2):
+            text = rest + self._chunk(idx)
+            cut = text.rfind(' ')
+            if cut < 0:
+                rest = text;  continue     # no blank yet: extend word
+            span,rest = text[:cut].strip(),text[cut+1:]
+            if span: yield span
+        if rest.strip(): yield rest.strip()
+
+    def _chunk(self,idx):
+        m,n = self.shape
+        base = (idx//2)*n + (idx%2)*(n//2)
+        end = min(base+n,self.size)
+        if isa(self.data,str):
+            chunk = self.data[base:end]
+        else:
+            lo = self._byte(self.offset+base);  hi = self._byte(self.offset+end)
+            chunk = self.data[lo:hi].translate(_NEWLINE).decode()
+        return chunk + ' '*(n-len(chunk)) if len(chunk) < n else chunk
 
     def __call__(self,idx=None):
-        if idx is None: return self.chunks
-        list = []
-        for c in self.chunks[idx]: list += c
-        return list
+        if idx is None: return list(self)
+        return list(self[idx])
 
     def __getitem__(self,idx):
-        return self.chunks[idx]
+        m,n = self.shape
+        if isa(idx,slice):
+            return [self._chunk(k) for k in range(*idx.indices(m))]
+        if idx < 0: idx += m
+        if idx < 0 or idx >= m: raise IndexError('chunk index out of range')
+        return self._chunk(idx)
 
     def __str__(self):
         m,n = self.shape
         more = '['; sep = ''
         for i in range(min(m,3)):
-            more += sep + "'" + str(self.chunks[i]) + "'"
+            more += sep + "'" + str(self[i]) + "'"
             sep = ','
         if m > 3: more += ',...'
         more += ']'
@@ -270,6 +434,8 @@ class Text:
     def __repr__(self):
         return self.__str__()
 
+_NEWLINE = bytes.maketrans(b'\n',b' ')
+
 #===============================================================================
 # doc test
 #===============================================================================
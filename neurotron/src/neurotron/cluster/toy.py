@@ -4,7 +4,7 @@ module neurotron.cluster.toy
 """
 
 from neurotron.cluster.token import Token, Text
-from neurotron.shakespear import shakespear
+from neurotron.data import shakespear
 
 #===============================================================================
 # class Toy
@@ -76,8 +76,8 @@ class Toy:
         n = n if n is not None else 8
         self.shape = (2,8,4,3)
         self.bits = 3
-        self.raw = Text().refine(shakespear)
-        self.text = Text(self.raw,n)
+        self.text = Text(shakespear(),n)
+        self.raw = self.text.data
 
     def __repr__(self):
         return self.__str__()
@@ -1,18 +1,136 @@
 """
 module neurotron.cluster.trainer
     class Cells    # derived class of Cluster
+    class Contexts # prefix trie of training contexts
     class Train    # sequence trainer
     class Trainer  # advanced sequence trainer
 """
 
-from neurotron.cluster.cells import Cluster, Cells, follow
-from neurotron.cluster.token import Token
+import os
+from multiprocessing import Pool
+from neurotron.cluster.cells import Cluster, Cells, SynapseErr, follow
+from neurotron.cluster.token import Token, Text
+from neurotron.ansi import Ansi
 from neurotron.math.matrix import Matrix
 from neurotron.cluster.toy import Toy
 from neurotron.cluster.monitor import Record, Monitor
 import neurotron.math as nm
+import numpy as np
 isa = isinstance
 
+#===============================================================================
+# class Contexts
+#===============================================================================
+
+class Contexts:
+    """
+    class Contexts: prefix trie of training contexts with integer ids. Context
+    c > 0 extends context parent[c] by word[c] (context 0 is the empty root),
+    e.g. '<Mary likes>' extends '<Mary>' by 'likes'. info[c] holds the '#'
+    and '@' entries, count[c] counts transitions parent[c] -> c, and
+    children[c] lists the transitions of c in order of occurrence. Indexing
+    by context strings provides the former dict view.
+    >>> contexts = Contexts()
+    >>> c = contexts.add(0,'Mary',([0],'#0','Mary'),['#0'])
+    >>> d = contexts.add(c,'likes',([2],'#1','likes'),['#1'])
+    >>> contexts.bump(d)
+    >>> contexts.string(d), contexts.find('<Mary likes>') == d
+    ('<Mary likes>', True)
+    >>> contexts['<Mary>']
+    {'#': ([0], '#0', 'Mary'), '@': ['#0'], 'likes': (1, '<Mary likes>', [2])}
+    >>> list(contexts), '<Mary>' in contexts, '<John>' in contexts
+    (['<Mary>', '<Mary likes>'], True, False)
+    """
+    def __init__(self):
+        self.parent = [-1]          # parent context id
+        self.word = ['']            # word extending parent context
+        self.info = [None]          # ('#' entry,'@' entry) or None (hidden)
+        self.count = [0]            # transition count parent -> context
+        self.children = [[]]        # transitions in order of occurrence
+        self.total = [0]            # sum of transition counts of context
+        self.addr = [None]          # cell addresses of context
+        self.order = []             # visible contexts in order of creation
+        self._child = {}            # (parent,word) -> context id
+
+    def node(self,parent,word):     # get or create (hidden) context id
+        c = self._child.get((parent,word))
+        if c is None:
+            c = len(self.parent);  self._child[(parent,word)] = c
+            self.parent.append(parent);  self.word.append(word)
+            self.info.append(None);  self.count.append(0)
+            self.children.append([]);  self.total.append(0)
+            self.addr.append(None)
+        return c
+
+    def add(self,parent,word,sharp,at,addr=None):  # add visible context
+        c = self.node(parent,word)
+        if self.info[c] is None: self.order.append(c)
+        self.info[c] = (sharp,at);  self.addr[c] = addr
+        return c
+
+    def bump(self,c,count=1):       # count transition parent[c] -> c
+        parent = self.parent[c]
+        if self.count[c] == 0: self.children[parent].append(c)
+        self.count[c] += count;  self.total[parent] += count
+
+    def path(self,context):         # context id of string, create if missing
+        if isa(context,int): return context
+        c = 0
+        if context != '':
+            for word in context[1:-1].split(' '):
+                c = self.node(c,word)
+        return c
+
+    def find(self,context):         # id of visible context (or None)
+        if isa(context,int):
+            c = context
+        else:
+            c = 0
+            for word in ([] if context == '' else context[1:-1].split(' ')):
+                c = self._child.get((c,word))
+                if c is None: return None
+        return c if self.info[c] is not None else None
+
+    def string(self,c):             # context string of context id
+        words = []
+        while c > 0:
+            words.append(self.word[c]);  c = self.parent[c]
+        return '' if words == [] else '<' + ' '.join(reversed(words)) + '>'
+
+    def entry(self,c):              # dict view of context c
+        sharp,at = self.info[c]
+        dict = {'#':sharp,'@':at}
+        for child in self.children[c]:
+            dict[self.word[child]] = (self.count[child],self.string(child),
+                                      self.info[child][0][0])
+        return dict
+
+    def __contains__(self,context):
+        return self.find(context) is not None
+
+    def __getitem__(self,context):
+        c = self.find(context)
+        if c is None: raise KeyError(context)
+        return self.entry(c)
+
+    def __iter__(self):
+        return (self.string(c) for c in self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(self.string(c),self.entry(c)) for c in self.order]
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+    def __repr__(self):
+        return self.__str__()
+
 #===============================================================================
 # class Train
 #===============================================================================
@@ -28,7 +146,7 @@ class Train:
     def __init__(self,cells=None,plot=False,verbose=0):
         self.memory = {}
         self._words = {}
-        self._contexts = {}
+        self._contexts = Contexts()
         self.cells = Cells() if cells is None else cells
 
         self.learning = True   # learning on the fly during training
@@ -152,45 +270,44 @@ class Train:
                #: ([2, 7, 8], '#1', 'likes')
                @: ['#1', [1 1 1; 0 0 0], '2.0-7.0-8.0']
         """
+        c = self._step(self._contexts.path(curctx),word,verbose,plot)
+        return self._contexts.string(c)
+
+    def _step(self,c,word,verbose=0,plot=False):  # train step from context c
         if self.cells.char:
             word = word if word != ' ' else '_'
+        newctx = self._enter(c,word)
+        if self.learning:  # learning on the fly during traiing?
+            self.learn(c,verbose=verbose,plot=plot)
+        return newctx
+
+    def _enter(self,c,word,count=1):  # enter transition from context id c
         if not word in self._words: self._word(word,True)
-        if curctx == '':
-            newctx = '<' + word + '>'
-        else:
-            newctx = '<' + curctx[1:-1] + ' ' + word + '>'
+        contexts = self._contexts
+        newctx = contexts.node(c,word)
 
-            # example: curctx = '<Mary>', word = 'likes'
-            #          newctx = '<Mary likes>'
+            # example: c = <Mary>, word = 'likes' => newctx = <Mary likes>
 
-        if not newctx in self._contexts:
-            if not curctx == '': self._word(word,False) # next word representation
-            triple = self._words[word]
-            idx,key,M = triple     # triple = ([2, 7, 8], '#1', [1 1 1; 0 0 0])
-            idx = self.index(self.token(word))
-            dict = {'#':(idx,key,word)}
-            code = self.code(M)
-            tag = '';  sep = ''
-            for k in range(code.shape[1]):
-                tag += sep + '%g.%g' % (idx[k],code[0,k]); sep = '-'
-            dict['@'] = [key,M,tag]
-            self._contexts[newctx] = dict
-
-        if curctx in self._contexts:
-            idx = self.index(self.token(word))
-            dict = self._contexts[curctx]
-            if word in dict:
-                count,value,index = dict[word]
-                assert value == newctx
-                assert index == idx
-            else:
-                count = 0
-            dict[word] = (count+1,newctx,idx)
-            self._contexts[curctx] = dict
-        if self.learning:  # learning on the fly during traiing?
-            self.learn(curctx,verbose=verbose,plot=plot)
+        if contexts.info[newctx] is None:
+            if c != 0: self._word(word,False) # next word representation
+            sharp,at,addr = self._entry(word,self._words[word])
+            contexts.add(c,word,sharp,at,addr)
+
+        if contexts.info[c] is not None:
+            contexts.bump(newctx,count)
         return newctx
 
+    def _entry(self,word,triple):  # '#','@' entries and addresses of context
+        idx,key,M = triple     # triple = ([2, 7, 8], '#1', [1 1 1; 0 0 0])
+        idx = self.index(self.token(word))
+        code = self.code(M)
+        tag = '';  sep = ''
+        for k in range(code.shape[1]):
+            tag += sep + '%g.%g' % (idx[k],code[0,k]); sep = '-'
+        m = self.cells.shape[0]
+        addr = [idx[k]*m + code[0,k] for k in range(code.shape[1])]
+        return (idx,key,word),[key,M,tag],addr
+
     def _sequence(self,context,sequence,verbose=0,plot=False):
         """
         process sequence:
@@ -198,9 +315,10 @@ class Train:
         >>> train._sequence('',['Mary','likes'])
         '<Mary likes>'
         """
+        c = self._contexts.path(context)
         for word in sequence:
-            context = self._train(context,word,verbose=verbose,plot=plot)
-        return context
+            c = self._step(c,word,verbose=verbose,plot=plot)
+        return self._contexts.string(c)
 
     def __call__(self,context,arg=None,verbose=None,plot=None):
         """
@@ -243,6 +361,70 @@ class Train:
     def __repr__(self):
         return self.__str__()
 
+    def save(self,path):
+        """
+        save cells and training tables to directory path (see Cluster.save);
+        words and contexts are stored as integer arrays, their entries are
+        rebuilt from the token on load
+        >>> import tempfile;  path = tempfile.mkdtemp()
+        >>> train = Trainer(Cells('Mary'))
+        >>> _ = train('Mary likes to sing');  _ = train('John likes to dance')
+        >>> train.save(path);  loaded = Trainer.load(path)
+        >>> str(loaded._words) == str(train._words)
+        True
+        >>> str(loaded._contexts) == str(train._contexts)
+        True
+        >>> loaded.cells.run('John',...)
+        ['John', '->', 'likes', 'to', 'dance', '']
+        """
+        self.cells.save(path)
+        contexts = self._contexts
+        vocab = list(dict.fromkeys(list(self._words) + contexts.word[1:]))
+        wid = {word:k for k,word in enumerate(vocab)}
+        children = contexts.children
+        np.savez_compressed(os.path.join(path,'trainer.npz'),
+            vocab=np.array(vocab,dtype=str),
+            keys=[int(self._words[word][1][1:]) for word in self._words],
+            parent=contexts.parent,
+            word=[-1]+[wid[word] for word in contexts.word[1:]],
+            key=[-1 if info is None else int(info[0][1][1:])
+                 for info in contexts.info],
+            count=contexts.count,total=contexts.total,order=contexts.order,
+            ptr=np.cumsum([0]+[len(c) for c in children]),
+            child=[c for cc in children for c in cc])
+
+    @classmethod
+    def load(cls,path,mmap=True):
+        train = cls(Cells.load(path,mmap))
+        with np.load(os.path.join(path,'trainer.npz')) as data:
+            table = {tag:data[tag].tolist() for tag in data.files}
+        vocab = table['vocab'];  reps = {}
+
+        def triple(word,k):    # word representation '#k'
+            idx = train.index(train.token(word))
+            m = train.cells.shape[0];  n = len(idx)
+            M = reps.setdefault(n,[Matrix(m,n)])  # representations #0,#1,..
+            while len(M) <= k: M.append(train.next(M[-1]))
+            return (idx,'#%g' % k,M[k])
+
+        for word,k in zip(vocab,table['keys']):
+            train._words[word] = triple(word,k)
+        contexts = train._contexts;  ptr = table['ptr']
+        contexts.parent = table['parent'];  contexts.count = table['count']
+        contexts.word = [''] + [vocab[w] for w in table['word'][1:]]
+        contexts.total = table['total'];  contexts.order = table['order']
+        contexts.children = [table['child'][ptr[c]:ptr[c+1]]
+                             for c in range(len(contexts.parent))]
+        contexts.info = [];  contexts.addr = []
+        for word,k in zip(contexts.word,table['key']):
+            sharp,at,addr = (None,None,None) if k < 0 else \
+                            train._entry(word,triple(word,k))
+            contexts.info.append(None if k < 0 else (sharp,at))
+            contexts.addr.append(addr)
+        contexts._child = {(contexts.parent[c],contexts.word[c]):c
+                           for c in range(1,len(contexts.parent))}
+        return train
+
     def show(self,token=True):
         if token:
             print('token:')
@@ -271,26 +453,33 @@ class Trainer(Train):
         return super().__call__(context,n,verbose=verbose,plot=plot)
 
     def prediction(self,context):
-        if context in self._contexts:
-            info = self._contexts[context]
-            counters = []; total = 0
-            for key in info:
-                if not key in ['#','@']:
-                    n,refer,idx = info[key]
-                    total += n
-                    counters.append(n)
-                    #print('    statistics: %s:' % key,(counters,total))
-            result = []; k = 0
-            src = self.address(context)
-            for key in info:
-                if not key in ['#','@']:
-                    ratio = counters[k]/total
-                    k += 1
-                    n,refer,idx = info[key]
-                    dst = self.address(refer)
-                    result.append((refer,ratio,src,dst))
-                    #print('    predict(%g%%): %s ->'%(100*ratio,key),info[key])
-            return result
+        c = self._contexts.find(context)
+        if c is None: return None
+        return [(self._contexts.string(dst),ratio,src,kdx)
+                for dst,ratio,src,kdx in self._transitions(c)]
+
+    def _transitions(self,c):   # (dst id,ratio,src,dst addresses) of c
+        contexts = self._contexts
+        total = contexts.total[c];  src = contexts.addr[c]
+        return [(child,contexts.count[child]/total,src,contexts.addr[child])
+                for child in contexts.children[c]]
+
+    def table(self):            # prediction table (context,dst,ratio,src,dst)
+        """
+        prediction table rows (c,dst,ratio,src,kdx): transition from context
+        c to context dst with probability ratio, src and kdx being the cell
+        addresses of both contexts
+        >>> train = Trainer(Cells('Mary'));  train.learning = False
+        >>> _ = train('Mary likes to sing');  _ = train('Mary likes to hike')
+        >>> for row in train.table(): print(row)
+        (1, 2, 1.0, [0, 14, 16], [4, 14, 16])
+        (2, 3, 1.0, [4, 14, 16], [6, 14, 16])
+        (3, 4, 0.5, [6, 14, 16], [8, 14, 16])
+        (3, 5, 0.5, [6, 14, 16], [10, 14, 16])
+        """
+        for c in self._contexts.order:
+            for dst,ratio,src,kdx in self._transitions(c):
+                yield (c,dst,ratio,src,kdx)
 
     def predict(self,context):
         results = self.prediction(context)
@@ -299,23 +488,20 @@ class Trainer(Train):
             print('    %g%%: ->' % (100*ratio),refer,src,dst)
 
     def address(self,context):
-        if context in self._contexts:
-            info = self._contexts[context]
-            m,n,d,s = self.cells.shape
-            idx = self.code((info['@'][1])).list()[0];
-            jdx = info['#'][0]
-            assert len(idx) == len(jdx)
-            kdx = [jdx[s]*m+idx[s] for s in range(len(idx))]
-            #return ((m,n),idx,jdx,kdx)
-            return kdx
-        return None
+        c = self._contexts.find(context)
+        return None if c is None else self._address(c)
+
+    def _address(self,c):
+        return list(self._contexts.addr[c])
 
     def learn(self,context,verbose=0,plot=False):
-        results = self.prediction(context)
-        if results is None: return
-        for prediction in results:
+        c = self._contexts.find(context)
+        if c is None: return
+        for prediction in self._transitions(c):
             refer,ratio,src,dst = prediction
+            if verbose or plot: refer = self._contexts.string(refer)
             if verbose:
+                context = self._contexts.string(c)
                 print('    %4.1f%%:' % (100*ratio),context,'->',refer,src,dst)
             self.cells.init()
             for k in dst:
@@ -324,9 +510,8 @@ class Trainer(Train):
                 self.cells.Y[k] = 1
 
             self.cells.connect(src,dst)
-            title = 'learn: ' + refer
-            #if self.plotting: self.plot(title)
-            if plot: self.plot(title)
+            #if self.plotting: self.plot('learn: ' + refer)
+            if plot: self.plot('learn: ' + refer)
             self.cells.init()
 
     def program(self,verbose=0):   # learn all contexts
@@ -335,20 +520,75 @@ class Trainer(Train):
         >>> train = Trainer(Cells('Mary'))
         >>> train.program()
         """
-        for context in self._contexts:
-            results = self.prediction(context)
-            for prediction in results:
-                refer,ratio,src,dst = prediction
-                for k in dst:
-                    self.cells.X[k] = 1
-                for k in src:
-                    self.cells.Y[k] = 1
-                try:
-                    self.cells.connect(src,dst)
-                    if verbose:
-                        print(Ansi.G + '    learning:',context,'OK'+Ansi.N)
-                except SynapseErr:
-                    print(Ansi.R+'    learning:',context,'FAIL'+Ansi.N)
+        table = list(self.table())
+        X = np.asarray(self.cells.X).T;  Y = np.asarray(self.cells.Y).T
+        for c,refer,ratio,src,dst in table:   # k = i+j*m
+            X.flat[dst] = 1;  Y.flat[src] = 1
+        try:
+            self.cells.connect_many([(src,dst) for c,_,_,src,dst in table])
+            failed = set()
+        except SynapseErr as err:
+            failed = {nn for nn,k in err.failed}
+        for nn,(c,refer,ratio,src,dst) in enumerate(table):
+            if nn in failed:
+                context = self._contexts.string(c)
+                print(Ansi.R+'    learning:',context,'FAIL'+Ansi.N)
+            elif verbose:
+                context = self._contexts.string(c)
+                print(Ansi.G + '    learning:',context,'OK'+Ansi.N)
+
+    def shards(self,sequences,processes=None,shards=None,verbose=0):
+        """
+        train a corpus of sequences: the contexts of contiguous shards are
+        counted in a process pool, merged in order of first occurrence and
+        replayed, which yields the same word representations ('#k') and
+        contexts as serial training; finally all contexts are programmed
+        >>> serial = Trainer(Cells((2,9,8,3),3));  serial.learning = False
+        >>> corpus = ['Mary likes to sing','John likes to dance','Mary likes']
+        >>> for sequence in corpus: _ = serial(sequence)
+        >>> train = Trainer(cells:=Cells((2,9,8,3),3))
+        >>> train.shards(corpus,processes=2,shards=3)
+        >>> train._words['likes'][1], train._contexts['<Mary>']['likes'][0]
+        ('#2', 2)
+        >>> str(train._words) == str(serial._words)
+        True
+        >>> str(train._contexts) == str(serial._contexts)
+        True
+        >>> cells.run('John',...)
+        ['John', '->', 'likes', 'to', 'dance', '']
+
+        a Text is trained as its word-aligned spans (see Text.spans), split
+        into characters or words as the cells process them
+        >>> text = Text('Mary likes to sing John likes to dance',20)
+        >>> train = Trainer(Cells((2,9,8,3),3));  train.shards(text,1)
+        >>> list(train._words)
+        ['Mary', 'likes', 'to', 'sing', 'John', 'dance']
+        >>> train = Trainer(Cells((2,9,8,3),3,char=True))
+        >>> train.shards(Text('ab ba ab',8),1);  list(train._words)
+        ['a', 'b', '_']
+        """
+        if isa(sequences,Text):     # characters or words, as cells process
+            split = list if self.cells.char else str.split
+            sequences = [split(span) for span in sequences.spans()]
+        sequences = [seq.split() if isa(seq,str) else list(seq)
+                     for seq in sequences]
+        processes = os.cpu_count() if processes is None else processes
+        shards = processes if shards is None else shards
+        size = max(1,-(-len(sequences)//shards))     # ceil
+        chunks = [(sequences[k:k+size],self.cells.char)
+                  for k in range(0,len(sequences),size)]
+
+        if processes > 1 and len(chunks) > 1:
+            with Pool(min(processes,len(chunks))) as pool:
+                counted = pool.map(_count,chunks)
+        else:
+            counted = [_count(chunk) for chunk in chunks]
+
+        for nodes in counted:       # merge in order of first occurrence
+            ids = [0]               # shard context id -> context id
+            for parent,word,n in nodes:
+                ids.append(self._enter(ids[parent],word,n))
+        self.program(verbose=verbose)
 
     def plot(self,title=''):
         m,n,d,s = self.cells.shape
@@ -364,6 +604,30 @@ class Trainer(Train):
             self.plot()
         return prediction
 
+#===============================================================================
+# helper
+#===============================================================================
+
+def _count(shard):              # count context transitions of a shard
+    """
+    returns (parent,word,count) per context of the shard in order of first
+    occurrence, parent being the position of the parent context (+1)
+    >>> _count(([['a','b'],['a',' ']],True))
+    [(0, 'a', 2), (1, 'b', 1), (1, '_', 1)]
+    """
+    sequences,char = shard
+    ids = {}                    # (parent,word) -> shard context id
+    nodes = []
+    for sequence in sequences:
+        c = 0
+        for word in sequence:
+            if char and word == ' ': word = '_'
+            key = (c,word)
+            if key not in ids:
+                nodes.append([c,word,0]);  ids[key] = len(nodes)
+            c = ids[key];  nodes[c-1][2] += 1
+    return [tuple(node) for node in nodes]
+
 #===============================================================================
 # unit tests
 #===============================================================================
@@ -0,0 +1,26 @@
+"""
+neurotron.data: data resources (loaded lazily and cached)
+   functions:
+       shakespear  Tiny Shakespear corpus (from shakespear.txt.gz)
+"""
+
+import gzip
+from importlib import resources
+
+_cache = {}
+
+def _load(name):               # decompressed text of a data resource
+    if name not in _cache:
+        with resources.files(__name__).joinpath(name).open('rb') as file:
+            _cache[name] = gzip.decompress(file.read()).decode()
+    return _cache[name]
+
+def shakespear():
+    """
+    Tiny Shakespear corpus (decompressed on first call, then cached)
+    >>> text = shakespear(); text[:14], len(text)
+    ('First Citizen:', 1115390)
+    >>> shakespear() is text
+    True
+    """
+    return _load('shakespear.txt.gz')
@@ -0,0 +1,323 @@
+"""
+module backend: compute backends for the cluster primitives
+- class Reference       # element-wise reference implementation
+- class Numpy           # vectorized NumPy backend (default)
+- class Numba           # JIT compiled backend (requires numba)
+- backend               # current backend
+- use                   # select backend by name
+- available             # names of the usable backends
+
+Backend primitives (plain ndarrays in, plain ndarrays out):
+- gather                # presynaptic values v[index]
+- masked_add            # rows k of X + Y
+- clip                  # clip X to [lo,hi] (in place)
+- threshold             # X >= theta
+- reduce                # sum along the last axis
+- AND, OR, NOT          # logical operations (on X != 0)
+
+The backend is selected by the NEUROTRON_BACKEND environment variable
+(reference, numpy or numba) on first use, or by use() later on.
+"""
+
+import os
+import warnings
+import importlib.util
+from types import SimpleNamespace
+import numpy as np
+
+#===============================================================================
+# class Reference
+#===============================================================================
+
+class Reference:
+    """
+    class Reference: element-wise loop implementation of the backend
+    primitives, serving as reference for the parity tests of all other
+    backends (slow, not intended for production runs)
+    >>> ref = Reference();  X = np.array([[0.2,0.9],[0.5,0.1]])
+    >>> ref.threshold(ref.reduce(X),1).tolist()
+    [True, False]
+    >>> ref.clip(ref.masked_add(X,X,np.array([1])),0,1).tolist()
+    [[1.0, 0.2]]
+    """
+    name = 'reference'
+
+    def gather(self,v,index):          # V[...] = v[index[...]]
+        V = np.zeros(index.shape,dtype=v.dtype)
+        for idx in np.ndindex(index.shape):
+            V[idx] = v[index[idx]]
+        return V
+
+    def masked_add(self,X,Y,k):        # rows k of X + Y
+        Z = np.zeros((len(k),)+X.shape[1:],dtype=np.result_type(X,Y))
+        for r,kk in enumerate(k):
+            for idx in np.ndindex(X.shape[1:]):
+                Z[(r,)+idx] = X[(kk,)+idx] + Y[(kk,)+idx]
+        return Z
+
+    def clip(self,X,lo,hi):            # clip X in place (as np.clip)
+        for idx in np.ndindex(X.shape):
+            X[idx] = _clip(X[idx],lo,hi)
+        return X
+
+    def threshold(self,X,theta):
+        Z = np.zeros(X.shape,dtype=bool)
+        for idx in np.ndindex(X.shape):
+            Z[idx] = X[idx] >= theta
+        return Z
+
+    def reduce(self,X):                # sum along last axis (in order)
+        Z = np.zeros(X.shape[:-1],dtype=_sumtype(X))
+        for idx in np.ndindex(X.shape):
+            Z[idx[:-1]] += X[idx]
+        return Z
+
+    def AND(self,X,Y):
+        X,Y = np.broadcast_arrays(X,Y)
+        Z = np.zeros(X.shape,dtype=bool)
+        for idx in np.ndindex(X.shape):
+            Z[idx] = X[idx] != 0 and Y[idx] != 0
+        return Z
+
+    def OR(self,X,Y):
+        X,Y = np.broadcast_arrays(X,Y)
+        Z = np.zeros(X.shape,dtype=bool)
+        for idx in np.ndindex(X.shape):
+            Z[idx] = X[idx] != 0 or Y[idx] != 0
+        return Z
+
+    def NOT(self,X):
+        X = np.asarray(X);  Z = np.zeros(X.shape,dtype=bool)
+        for idx in np.ndindex(X.shape):
+            Z[idx] = X[idx] == 0
+        return Z
+
+    def __str__(self):
+        return 'Backend(%s)' % self.name
+
+    def __repr__(self):
+        return self.__str__()
+
+#===============================================================================
+# class Numpy
+#===============================================================================
+
+class Numpy(Reference):
+    """
+    class Numpy: vectorized NumPy backend (default)
+    >>> Numpy().AND(np.array([0,1,2]),np.array([1,1,0])).tolist()
+    [False, True, False]
+    """
+    name = 'numpy'
+
+    def gather(self,v,index):
+        return v[index]
+
+    def masked_add(self,X,Y,k):
+        return X[k] + Y[k]
+
+    def clip(self,X,lo,hi):
+        return np.clip(X,lo,hi,out=X)
+
+    def threshold(self,X,theta):
+        return X >= theta
+
+    def reduce(self,X):
+        return X.sum(axis=-1)
+
+    def AND(self,X,Y):
+        return np.logical_and(X,Y)
+
+    def OR(self,X,Y):
+        return np.logical_or(X,Y)
+
+    def NOT(self,X):
+        return np.logical_not(X)
+
+#===============================================================================
+# class Numba
+#===============================================================================
+
+class Numba(Numpy):
+    """
+    class Numba: backend with numba compiled loops over flat arrays (raises
+    ImportError if numba is not installed); kernels are compiled lazily on
+    first call for each argument type signature
+    """
+    name = 'numba'
+
+    def __init__(self):
+        import numba
+        self._jit = _kernels(numba.njit)
+
+    def gather(self,v,index):
+        V = np.empty(index.shape,dtype=v.dtype)
+        self._jit.gather(np.ascontiguousarray(v),_flat(index),V.reshape(-1))
+        return V
+
+    def masked_add(self,X,Y,k):
+        X = np.ascontiguousarray(X);  Y = np.ascontiguousarray(Y)
+        Z = np.empty((len(k),)+X.shape[1:],dtype=np.result_type(X,Y))
+        self._jit.masked_add(X.reshape(len(X),-1),Y.reshape(len(Y),-1),
+                             _flat(k),Z.reshape(len(k),-1))
+        return Z
+
+    def clip(self,X,lo,hi):
+        if not X.flags.c_contiguous:
+            X[...] = self.clip(X.copy(),lo,hi)
+            return X
+        self._jit.clip(X.reshape(-1),lo,hi)
+        return X
+
+    def threshold(self,X,theta):
+        Z = np.empty(X.shape,dtype=bool)
+        self._jit.threshold(_flat(X),theta,Z.reshape(-1))
+        return Z
+
+    def reduce(self,X):
+        Z = np.empty(X.shape[:-1],dtype=_sumtype(X))
+        s = X.shape[-1] if X.ndim else 1
+        self._jit.reduce(_flat(X).reshape(-1,s),Z.reshape(-1))
+        return Z
+
+    def AND(self,X,Y):
+        X,Y = np.broadcast_arrays(X,Y)
+        Z = np.empty(X.shape,dtype=bool)
+        self._jit.AND(_flat(X),_flat(Y),Z.reshape(-1))
+        return Z
+
+    def OR(self,X,Y):
+        X,Y = np.broadcast_arrays(X,Y)
+        Z = np.empty(X.shape,dtype=bool)
+        self._jit.OR(_flat(X),_flat(Y),Z.reshape(-1))
+        return Z
+
+    def NOT(self,X):
+        X = np.asarray(X);  Z = np.empty(X.shape,dtype=bool)
+        self._jit.NOT(_flat(X),Z.reshape(-1))
+        return Z
+
+def _kernels(njit):    # compile the loop kernels of the Numba backend
+    @njit
+    def gather(v,index,out):
+        for i in range(index.size):
+            out[i] = v[index[i]]
+
+    @njit
+    def masked_add(X,Y,k,out):
+        for r in range(k.size):
+            for j in range(X.shape[1]):
+                out[r,j] = X[k[r],j] + Y[k[r],j]
+
+    clip1 = njit(_clip)
+
+    @njit
+    def clip(X,lo,hi):
+        for i in range(X.size):
+            X[i] = clip1(X[i],lo,hi)
+
+    @njit
+    def threshold(X,theta,out):
+        for i in range(X.size):
+            out[i] = X[i] >= theta
+
+    @njit
+    def reduce(X,out):
+        for i in range(X.shape[0]):
+            acc = 0
+            for j in range(X.shape[1]):
+                acc += X[i,j]
+            out[i] = acc
+
+    @njit
+    def AND(X,Y,out):
+        for i in range(X.size):
+            out[i] = X[i] != 0 and Y[i] != 0
+
+    @njit
+    def OR(X,Y,out):
+        for i in range(X.size):
+            out[i] = X[i] != 0 or Y[i] != 0
+
+    @njit
+    def NOT(X,out):
+        for i in range(X.size):
+            out[i] = X[i] == 0
+
+    return SimpleNamespace(gather=gather,masked_add=masked_add,clip=clip,
+                           threshold=threshold,reduce=reduce,
+                           AND=AND,OR=OR,NOT=NOT)
+
+#===============================================================================
+# backend selection
+#===============================================================================
+
+_backends = {'reference':Reference, 'numpy':Numpy, 'numba':Numba}
+_current = None
+
+def available():
+    """
+    names of the usable backends
+    >>> available()[:2]
+    ['reference', 'numpy']
+    """
+    names = ['reference','numpy']
+    if importlib.util.find_spec('numba') is not None:
+        names.append('numba')
+    return names
+
+def use(name):
+    """
+    select backend by name (or reinstate a backend object) and return it
+    >>> saved = backend()
+    >>> use('reference'), backend()
+    (Backend(reference), Backend(reference))
+    >>> use(saved) is backend() is saved          # restore selection
+    True
+    """
+    global _current
+    if isinstance(name,Reference):
+        _current = name
+    elif name in _backends:
+        _current = _backends[name]()
+    else:
+        raise Exception('unknown backend: %s' % name)
+    return _current
+
+def backend():
+    """
+    current backend (NEUROTRON_BACKEND on first call, default numpy)
+    >>> backend().name in available()
+    True
+    """
+    if _current is None:
+        name = os.environ.get('NEUROTRON_BACKEND','numpy')
+        if name not in available():
+            warnings.warn('backend %s not available, using numpy' % name)
+            name = 'numpy'
+        use(name)
+    return _current
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def _flat(X):           # contiguous flat view (or copy) of X
+    return np.ascontiguousarray(X).reshape(-1)
+
+def _clip(x,lo,hi):    # np.clip of a scalar (NaN kept, -0.0 clipped to lo)
+    if x == x:
+        x = x if x > lo else lo
+        x = x if x < hi else hi
+    return x
+
+def _sumtype(X):        # dtype of a numpy sum over X
+    return np.zeros(1,dtype=X.dtype).sum().dtype
+
+#===============================================================================
+# doc test
+#===============================================================================
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -5,6 +5,9 @@ module field:
 Field methods:
 - construct             # Field construction
 - kappa                 # conversion between linear <-> quadratic index
+- set                   # set field from flat matrix
+- flat                  # convert field to flat matrix
+- tensor                # (m*n,d,s) tensor view in linear index order
 - permanence            # cnvert permanence to symbolic string
 - symbol                # convert symbol to index or vice versa
 - bar                   # create a labeled bar
@@ -25,7 +28,10 @@ from neurotron.math.helper import isa, isnumber
 
 class Field:
     """
-    class Field: implements a matrix of matrices (4-tensor)
+    class Field: implements a matrix of matrices (4-tensor), backed by a
+    single (m,n,d,s) ndarray; F[k] returns a Matrix view of cell k. A given
+    (m,n,d,s) array is wrapped without copy and must be laid out in linear
+    index order (a transposed C-order (n,m,d,s) array), else Field raises
     >>> T = Field(3,4,2,5)
     >>> T.map()
     +-000/0-+-003/3-+-006/6-+-009/9-+
@@ -51,25 +57,42 @@ class Field:
     | 00000 | 00000 | 00000 | 00000 |
     | 00000 | 00000 | 00000 | 00000 |
     +-------+-------+-------+-------+
+    >>> A = np.zeros((2,1,3,2));  T = Field(A.transpose(1,0,2,3))  # wrap
+    >>> T[1] = Matrix([[1,2],[3,4],[5,6]]);  T.shape, A[1,0,2,1]
+    ((1, 2, 3, 2), 6.0)
+    >>> Field(np.zeros((2,3,1,2)))    # C order: tensor() would be a copy
+    Traceback (most recent call last):
+    ...
+    Exception: Field(): array is not in linear index (column major) order
     """
 
     def __init__(self,arg=None,n=None,d=None,s=None):
         arg = 1 if arg is None else arg
-        if isinstance(arg,list):
+        if isinstance(arg,np.ndarray):   # wrap (m,n,d,s) array (no copy)
+            assert arg.ndim == 4
+            m,n,d,s = arg.shape
+            if not _linear(arg):
+                raise Exception('Field(): array is not in linear index '
+                                '(column major) order')
+            self.data = arg
+        elif isinstance(arg,list):
             assert len(arg) > 0
             assert isinstance(arg[0],list) and len(arg[0]) > 0
-            self.data = np.array(arg)
             m = len(arg); n = len(arg[0])
-            d,s = self.data[0,0].shape
+            d,s = arg[0][0].shape
+            self.data = _tensor(m,n,d,s)
+            for i in range(m):
+                for j in range(n):
+                    self.data[i,j] = arg[i][j]
         else:
             m = arg
             if n is None: n = 1
             if d is None: d = 1
             if s is None: s = 1
-            lst = [[Matrix(d,s) for j in range(n)] for i in range(m)]
-            self.data = np.array(lst)
+            self.data = _tensor(m,n,d,s)
         self.shape = (m,n,d,s)
         self.map = self.imap
+        self.observer = None       # called with k (or None) on writes
 
     def __getitem__(self,idx):
         """
@@ -85,12 +108,17 @@ class Field:
         [0.548814 0.715189 0.602763]
         >>> T[3]
         [0.548814 0.715189 0.602763]
+        >>> T[3][0,1] = 0; T[1,1]      # T[k] is a view into the field
+        [0.548814 0 0.602763]
+        >>> T.observer = print        # observe writes by linear index
+        >>> T[1,2] = Matrix([[1,2,3]])
+        5
         """
-        if isinstance(idx,int):
+        if isa(idx,int):
             i,j = self.kappa(idx)
         else:
             i,j = idx
-        return Matrix(self.data[i,j])
+        return self.data[i,j].view(Matrix)
 
     def __setitem__(self,idx,M):
         """
@@ -114,7 +142,9 @@ class Field:
         assert isa(M,Matrix)
         if self.data[i,j].shape != M.shape:
             raise Exception('Field.__setitem__(): size mismatch')
-        self.data[i,j] = M.copy()
+        self.data[i,j] = M             # copies into the field tensor
+        if self.observer is not None:
+            self.observer(self.kappa(i,j))
 
     def set(self,M):  # set field with flat matrix
         """
@@ -132,11 +162,33 @@ class Field:
         m,n,d,s = self.shape
         if (m*d,n*s) != M.shape:
             raise Exception('incompatible sizes')
-        for i in range(m):
-            for j in range(n):
-                Mij = M[i*d:i*d+d,j*s:j*s+s]
-                self[i,j] = Mij
+        self.data[...] = np.asarray(M).reshape(m,d,n,s).transpose(0,2,1,3)
+        if self.observer is not None:
+            self.observer(None)
 
+    def flat(self):  # convert field to flat matrix
+        """
+        >>> F = Field(m:=2,n:=2,d:=1,s:=3)
+        >>> M = Matrix([[1,2,3,4,5,6],[7,8,9,10,11,12]])
+        >>> F.set(M); F.flat()
+        [1 2 3 4 5 6; 7 8 9 10 11 12]
+        >>> F[1,0]
+        [7 8 9]
+        """
+        m,n,d,s = self.shape
+        return self.data.transpose(0,2,1,3).reshape(m*d,n*s).view(Matrix)
+
+    def tensor(self):  # (m*n,d,s) view, cells in linear index order
+        """
+        >>> F = Field(2,3,1,2)
+        >>> F[1,2] = Matrix([4,5]); T = F.tensor()
+        >>> T.shape, T[F.kappa(1,2)]
+        ((6, 1, 2), array([[4., 5.]]))
+        >>> T[0,0,1] = 7; F[0]
+        [0 7]
+        """
+        m,n,d,s = self.shape
+        return self.data.transpose(1,0,2,3).reshape(m*n,d,s)
 
     def kappa(self,i,j=None):
         """
@@ -345,6 +397,35 @@ class Field:
         m,n,d,s = self.shape
         self._table('w',self.cluster.P,m,n,width=max(s,7),label='')
 
+#===============================================================================
+# helper
+#===============================================================================
+
+def _linear(A):       # is the (m*n,d,s) tensor of A a view (no copy)?
+    """
+    >>> _linear(_tensor(2,3,4,5)), _linear(np.zeros((2,3,4,5)))
+    (True, False)
+    """
+    m,n,d,s = A.shape
+    T = A.transpose(1,0,2,3).view()
+    try:
+        T.shape = (m*n,d,s)            # raises if reshape needs a copy
+    except AttributeError:
+        return False
+    return True
+
+def _tensor(m,n,d,s):
+    """
+    allocate the (m,n,d,s) field tensor in one contiguous block; cells are
+    laid out in linear index order k = i + j*m (column major), so that the
+    (m*n,d,s) tensor view of all cells comes for free
+    >>> T = _tensor(2,3,4,5); T.shape
+    (2, 3, 4, 5)
+    >>> T.transpose(1,0,2,3).flags.c_contiguous
+    True
+    """
+    return np.zeros((n,m,d,s)).transpose(1,0,2,3)
+
 #===============================================================================
 # unit tests
 #===============================================================================
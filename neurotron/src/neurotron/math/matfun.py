@@ -23,6 +23,7 @@ import numpy as np
 #import matrix as mx
 from neurotron.math.matrix import Matrix
 from neurotron.math.helper import isa, isnumber
+from neurotron.math.backend import backend
 
 #===============================================================================
 # matrix functions
@@ -164,39 +165,7 @@ def MAX(arg1,arg2=None):
             return arg1
         elif scalar2:
             return max(arg1,arg2)
-        else:
-            arg1 = arg1 + 0*arg2
-    elif scalar2:
-        arg2 = arg2 + 0*arg1
-
-    m,n = arg1.shape
-    if arg2 is None:
-        if m == 1:
-            s = arg1[0,0]
-            for j in range(1,n): s = max(s,arg1[0,j])
-            return int(s) if s == int(s) else s
-        elif n == 1:
-            s = arg1[0,0]
-            for i in range(m): s = max(s,arg1[i,0])
-            return int(s) if s == int(s) else s
-        M = Matrix(1,n)
-        for j in range(n):
-            maxi = arg1[0,j]
-            for i in range(1,m):
-                maxi = max(arg1[i,j],maxi)
-            M[0,j] = maxi
-    else:
-        assert arg1.shape == arg2.shape
-        M = Matrix(m,n)
-        for i in range(m):
-            for j in range(n):
-                M[i,j] = max(arg1[i,j],arg2[i,j])
-    m,n = M.shape
-    if m != 1 or n != 1:
-        return M
-    result = M.item()
-    iresult = int(result)
-    return iresult if iresult == result else result
+    return _reduce(np.max,np.maximum,arg1,arg2)
 
 def MIN(arg1,arg2=None):
     """
@@ -229,39 +198,7 @@ def MIN(arg1,arg2=None):
             return arg1
         elif scalar2:
             return min(arg1,arg2)
-        else:
-            arg1 = arg1 + 0*arg2
-    elif scalar2:
-        arg2 = arg2 + 0*arg1
-
-    m,n = arg1.shape
-    if arg2 is None:
-        if m == 1:
-            s = arg1[0,0]
-            for j in range(1,n): s = min(s,arg1[0,j])
-            return int(s) if s == int(s) else s
-        elif n == 1:
-            s = arg1[0,0]
-            for i in range(m): s = min(s,arg1[i,0])
-            return int(s) if s == int(s) else s
-        M = Matrix(1,n)
-        for j in range(n):
-            maxi = arg1[0,j]
-            for i in range(1,m):
-                maxi = min(arg1[i,j],maxi)
-            M[0,j] = maxi
-    else:
-        assert arg1.shape == arg2.shape
-        M = Matrix(m,n)
-        for i in range(m):
-            for j in range(n):
-                M[i,j] = min(arg1[i,j],arg2[i,j])
-    m,n = M.shape
-    if m != 1 or n != 1:
-        return M
-    result = M.item()
-    iresult = int(result)
-    return iresult if iresult == result else result
+    return _reduce(np.min,np.minimum,arg1,arg2)
 
 def ALL(arg):
     """
@@ -293,18 +230,10 @@ def ALL(arg):
 
     m,n = arg.shape
     if m == 1 or n == 1:
-        return all(arg) + 0
+        return int(np.all(arg))
     elif m == 0 or n == 0:
         return 1
-
-    M = Matrix(1,n)
-    for j in range(n):
-        M[0,j] = all(arg[:,j])
-
-    m,n = M.shape
-    if m != 1 or n != 1:
-        return M
-    return M.item()+0
+    return Matrix(np.all(np.asarray(arg),axis=0).astype(float))
 
 def ANY(arg):
     """
@@ -338,18 +267,10 @@ def ANY(arg):
 
     m,n = arg.shape
     if m == 1 or n == 1:
-        return any(arg) + 0
+        return int(np.any(arg))
     elif m == 0 or n == 0:
         return 1
-
-    M = Matrix(1,n)
-    for j in range(n):
-        M[0,j] = any(arg[:,j])
-
-    m,n = M.shape
-    if m != 1 or n != 1:
-        return M
-    return M.item()+0
+    return Matrix(np.any(np.asarray(arg),axis=0).astype(float))
 
 def MAGIC(n):
     """
@@ -406,27 +327,12 @@ def SUM(arg):
         M = Matrix(arg)
         return SUM(M)
     elif isa(arg,Matrix):
-        #print('##### Matrix:',arg)
         m,n = arg.shape
         if m == 0 or n == 0:
             return []
-        elif m == 1:
-            s = 0
-            #print('##### row:',arg,'s:',s)
-            for j in range(n): s += arg[0,j]
-            return s
-        elif n == 1:
-            s = 0
-            for i in range(m): s += arg[i,0]
-            return s
-        else:
-            out = Matrix(1,n)
-            for j in range(n):
-                s = 0
-                for i in range(m):
-                    s += arg[i,j]
-                out[0,j] = s
-            return out
+        elif m == 1 or n == 1:
+            return _scalar(np.asarray(arg).sum())
+        return Matrix(np.asarray(arg).sum(axis=0).astype(float))
     else:
         return arg.sum()
 
@@ -442,33 +348,7 @@ def ROW(*args):
     >>> ROW([1,2],[3,4])
     [1 2 3 4]
     """
-    if len(args) == 0:
-        return Matrix([])
-    else:
-        M0 = args[0]
-        if not isinstance(M0,Matrix): M0 = Matrix(M0)
-        m,n = M0.shape
-        n = 0
-        for k in range(len(args)):
-            Mk = args[k]
-            if not isinstance(Mk,Matrix): Mk = Matrix(Mk)
-            mk,nk = Mk.shape
-            n += nk
-            if mk != m:
-                raise Exception('equal number of rows expected')
-        M = Matrix(m,n)
-        off = 0
-        for k in range(len(args)):
-            Mk = args[k];
-            if not isinstance(Mk,Matrix): Mk = Matrix(Mk)
-            mk,nk = Mk.shape
-            #print('##### Mk:',Mk)
-            assert mk == m
-            for i in range(mk):
-                for j in range(nk):
-                    M[i,off+j] = Mk[i,j]
-            off += nk
-        return M
+    return _concat(args,1,'equal number of rows expected')
 
 def COLUMN(*args):
     """
@@ -482,64 +362,99 @@ def COLUMN(*args):
     >>> COLUMN(Matrix([1,2]).T,Matrix([3,4]).T)
     [1; 2; 3; 4]
     """
-    if len(args) == 0:
-        return Matrix([])
-    else:
-        M0 = args[0]
-        if not isinstance(M0,Matrix): M0 = Matrix(M0)
-        m,n = M0.shape
-        m = 0
-        for k in range(len(args)):
-            Mk = args[k]
-            if not isinstance(Mk,Matrix): Mk = Matrix(Mk)
-            mk,nk = Mk.shape
-            m += mk
-            if nk != n:
-                raise Exception('equal number of columns expected')
-        M = Matrix(m,n)
-        off = 0
-        for k in range(len(args)):
-            Mk = args[k]
-            if not isinstance(Mk,Matrix): Mk = Matrix(Mk)
-            mk,nk = Mk.shape
-            assert nk == n
-            for i in range(mk):
-                for j in range(nk):
-                    M[off+i,j] = Mk[i,j]
-            off += mk
-        return M
+    return _concat(args,0,'equal number of columns expected')
 
 def NOT(x):
     """
+    logical not as int Matrix
     >>> A = Matrix([0,2,-1])
     >>> NOT(A)
     [1 0 0]
     """
-    X = (x != 0);
-    X = X if isa(X,Matrix) else Matrix(X)
-    return 1 - X
+    return Matrix(backend().NOT(np.asarray(x)).astype(int))
 
 def AND(x,y):
     """
+    logical and as bool Matrix (also for 1x1 operands)
     >>> A = Matrix([0,1,0]);  B = Matrix([1,1,0]);
     >>> AND(A,B)
     [0 1 0]
+    >>> AND(A,B).dtype, type(AND(Matrix([[1]]),Matrix([[1]]))).__name__
+    (dtype('bool'), 'Matrix')
     """
-    X = (x!=0);  Y = (y!=0)
-    X = X if isa(X,Matrix) else Matrix(X)
-    Y = Y if isa(Y,Matrix) else Matrix(Y)
-    return X * Y
+    return Matrix(backend().AND(np.asarray(x),np.asarray(y)))
 
 def OR(x,y):
     """
+    logical or as float Matrix, 1x1 results collapse to int (like MIN)
     >>> A = Matrix([0,1,0]);  B = Matrix([1,1,0]);
     >>> OR(A,B)
     [1 1 0]
+    >>> OR(A,B).dtype, OR(Matrix([[0]]),Matrix([[2]]))
+    (dtype('float64'), 1)
+    """
+    M = Matrix(backend().OR(np.asarray(x),np.asarray(y)).astype(float))
+    return _collapse(M)
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def _scalar(x):             # numpy scalar to int (if integral) or float
+    """
+    >>> _scalar(np.float64(3.0)), _scalar(np.float64(2.5)), _scalar(np.True_)
+    (3, 2.5, 1)
+    """
+    x = x.item()
+    return int(x) if x == int(x) else x
+
+def _reduce(reduce,elementwise,arg1,arg2):    # MATLAB style max/min
     """
-    X = (x!=0);  Y = (y!=0)
-    X = X if isa(X,Matrix) else Matrix(X)
-    Y = Y if isa(Y,Matrix) else Matrix(Y)
-    return MIN(1,X+Y)
+    >>> A = Matrix([[1,3,-2],[0,2,-1],[5,1,0]])
+    >>> _reduce(np.min,np.minimum,A,None)
+    [0 1 -2]
+    >>> _reduce(np.max,np.maximum,A[:,1],None)
+    3
+    """
+    if arg2 is None:                # column wise reduction
+        m,n = arg1.shape
+        if m == 1 or n == 1:
+            return _scalar(reduce(np.asarray(arg1)))
+        M = Matrix(reduce(np.asarray(arg1),axis=0).astype(float))
+    else:                           # element wise
+        if isa(arg1,Matrix) and isa(arg2,Matrix):
+            assert arg1.shape == arg2.shape
+        M = elementwise(np.asarray(arg1),np.asarray(arg2)).astype(float)
+        M = M.view(Matrix)
+    return _collapse(M)
+
+def _collapse(M):                 # 1x1 matrix to scalar (int if integral)
+    """
+    >>> _collapse(Matrix([[2.0]])), _collapse(Matrix([[1,2]]))
+    (2, [1 2])
+    """
+    m,n = M.shape
+    if m != 1 or n != 1:
+        return M
+    return _scalar(np.asarray(M)[0,0])
+
+def _concat(args,axis,msg):       # concatenate matrices along axis
+    """
+    >>> _concat(([1,2],Matrix([[3]])),1,'')
+    [1 2 3]
+    >>> _concat(([1,2],[3]),0,'mismatch')
+    Traceback (most recent call last):
+    ...
+    Exception: mismatch
+    """
+    if len(args) == 0:
+        return Matrix([])
+    arrays = [np.asarray(M if isa(M,Matrix) else Matrix(M)) for M in args]
+    other = 1 - axis
+    for M in arrays:
+        if M.shape[other] != arrays[0].shape[other]:
+            raise Exception(msg)
+    return np.concatenate(arrays,axis=axis).astype(float).view(Matrix)
 
 #===============================================================================
 # doc test
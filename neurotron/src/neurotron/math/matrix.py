@@ -145,6 +145,8 @@ class Matrix(np.ndarray):
         [2 1 0; 5 4 3]
         >>> A[K]
         [9 5 16; 7 11 2]
+        >>> A[Matrix([[11],[0]])]
+        [12; 16]
         >>> A[1,:]
         [5 11 10 8]
         >>> A[:,2]
@@ -168,17 +170,11 @@ class Matrix(np.ndarray):
                 if j < 0 or j >= n:
                     raise Exception('column index out of range')
                 idx = (i,slice(j,j+1,None))
-        elif isa(idx,Matrix):
-            #print('Matrix:',idx)
-            m,n = idx.shape
-            result = Matrix(m,n)
-            for i in range(m):
-                for j in range(n):
-                    k = idx[i,j]
-                    mu,nu = self.kappa(k)
-                    result[i,j] = super().__getitem__((mu,nu))
-                    #print('result[%g,%g]'%(i,j), 'k:',k,'(mu,nu)',(mu,nu))
-            return result
+        elif isa(idx,Matrix):       # gather by linear (column major) index
+            K = np.asarray(idx).astype(int)
+            m,n = self.shape
+            result = np.asarray(self)[K%m,K//m]
+            return np.asarray(result,dtype=float).view(Matrix)
         result = super().__getitem__(idx)
         if isa(result,np.int64) or isa(result,np.float64):
             iresult = int(result)
@@ -195,16 +191,18 @@ class Matrix(np.ndarray):
         >>> idx = Matrix(range(4))
         >>> M[idx] = idx; print(M)
         [0 2 0; 1 3 0]
+        >>> M[Matrix([[5],[0]])] = Matrix([7,8]); print(M)
+        [8 2 0; 1 3 7]
         """
         if isinstance(idx,Matrix):
             if not isinstance(value,Matrix):
                 raise Exception('Matrix expected for assigned value')
-            #print('idx:',idx)
             mx,nx = idx.shape;  mv,nv = value.shape
             if mv*nv != mx*nx:
                 raise Exception('mismatching number of elements')
-            for k in range(mv*nv):
-                self[idx[k]] = value[k]
+            K = np.asarray(idx).ravel(order='F').astype(int)
+            m,n = self.shape           # scatter by linear (column major) index
+            np.asarray(self)[K%m,K//m] = np.asarray(value).ravel(order='F')
             return
         elif isinstance(idx,int):
             idx = self.kappa(idx)
@@ -212,17 +210,11 @@ class Matrix(np.ndarray):
 
     def __call__(self): # convert to column vector
         """
-        A = Matrix(-2)
-        A()
-        [1; 3; 4; 2]
+        >>> A = Matrix(-2)
+        >>> A()
+        [1; 4; 3; 2]
         """
-        m,n = self.shape
-        out = Matrix(m*n,1)
-        for i in range(m):
-            for j in range(n):
-                k = self.kappa(i,j)
-                out[k,0] = super().__getitem__((i,j))
-        return out
+        return np.asarray(self).reshape((-1,1),order='F').view(Matrix)
 
     def __mul__(self,other):
         """
@@ -265,18 +257,12 @@ class Matrix(np.ndarray):
         [16 9 11 3 6 8; 5 2 7 10 13 12]
         >>> B.reshape(1,12)
         [16 5 9 2 11 7 3 10 6 13 8 12]
+        >>> C = B.reshape(3,4);  C[0,0] = 0;  B[0]  # view (no copy)
+        0
         """
-        v = self()  # convert to column
-        #print('### shape:',v.shape,'v:',v)
-        mn = v.shape[0]
-        if mn != m*n:
+        if self.size != m*n:
             raise Exception('incompatible dimensions for reshape')
-        out = Matrix(m,n)
-        for k in range(mn):
-            i,j = out.kappa(k)
-            #print('### i,j:',i,j)
-            out[i,j] = v[k,0]
-        return out
+        return np.asarray(self).reshape((m,n),order='F').view(Matrix)
 
     def list(self):
         """
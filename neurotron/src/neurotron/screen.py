@@ -7,12 +7,17 @@ from numpy import array, isnan, copy, arange, zeros, any
 from numpy.random import rand
 from ypstruct import struct
 
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-
-from matplotlib.transforms import Affine2D
+plt = patches = Affine2D = None        # matplotlib, imported on first use
 #import util
 
+def _matplotlib():                     # import matplotlib on first use
+    global plt, patches, Affine2D
+    if plt is None:
+        import matplotlib.pyplot as plt
+        import matplotlib.patches as patches
+        from matplotlib.transforms import Affine2D
+    return plt
+
 #=============================================================================
 # hash function
 #=============================================================================
@@ -59,7 +64,7 @@ class Canvas:
         self.ax = None
         self.position = pos
 
-        self.fig,self.ax = plt.subplots()
+        self.fig,self.ax = _matplotlib().subplots()
         self.frame()
         self.ax.axis('equal')
 
@@ -569,11 +574,11 @@ class Monitor:
                 self.text(x-0.35,y+0.3,"%g"%index,size=size)
 
     def line(self,x,y,color='k',linewidth=0.5):
-        plt.plot(x,y,color,linewidth=linewidth)
+        _matplotlib().plot(x,y,color,linewidth=linewidth)
 
     def text(self,x,y,txt,color='k',size=None,rotation=0,ha='center',va='center'):
         size = 10 if size is None else size
-        plt.text(x,y, txt, size=size, rotation=rotation, ha=ha, va=va, color=color)
+        _matplotlib().text(x,y, txt, size=size, rotation=rotation, ha=ha, va=va, color=color)
 
     def separator(self,j,color='k',linewidth=0.5):
         scr = self.data.screen
@@ -2,6 +2,7 @@
 
 import doctest
 import neurotron
+import neurotron.data
 from neurotron.ansi import Ansi
 
 err = 0
@@ -10,11 +11,15 @@ err += doctest.testmod(neurotron.math.attribute, verbose=False).failed
 err += doctest.testmod(neurotron.math.matrix, verbose=False).failed
 err += doctest.testmod(neurotron.math.matfun, verbose=False).failed
 err += doctest.testmod(neurotron.math.field, verbose=False).failed
+err += doctest.testmod(neurotron.math.backend, verbose=False).failed
 err += doctest.testmod(neurotron, verbose=False).failed
 
 err += doctest.testmod(neurotron.cluster.setup, verbose=False).failed
 err += doctest.testmod(neurotron.cluster.terminal, verbose=False).failed
+err += doctest.testmod(neurotron.cluster.sparse, verbose=False).failed
+err += doctest.testmod(neurotron.cluster.share, verbose=False).failed
 err += doctest.testmod(neurotron.cluster.cells, verbose=False).failed
+err += doctest.testmod(neurotron.cluster.kernel, verbose=False).failed
 
 err += doctest.testmod(neurotron.neurotron, verbose=False).failed
 
@@ -22,6 +27,7 @@ err += doctest.testmod(neurotron.cluster.monitor, verbose=False).failed
 err += doctest.testmod(neurotron.cluster.toy).failed
 err += doctest.testmod(neurotron.cluster.token).failed
 err += doctest.testmod(neurotron.cluster.trainer).failed
+err += doctest.testmod(neurotron.data).failed
 
 if err:
    print(Ansi.R+'doctests: total fails:'+Ansi.N,err)
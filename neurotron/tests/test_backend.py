@@ -0,0 +1,84 @@
+# test_backend.py: test compute backends against the reference backend
+
+import doctest
+import pytest
+import numpy as np
+
+import neurotron.math.backend
+from neurotron.math.backend import Reference, available, use, backend
+from neurotron.cluster.cells import Cluster
+
+#===============================================================================
+# fixture
+#===============================================================================
+
+@pytest.fixture
+def validator():
+    return Validator()
+
+class Validator:
+    def call(self,func) -> bool:
+        return func()
+
+@pytest.fixture(params=available())
+def be(request):                       # selected backend (restored after)
+    saved = backend()
+    yield use(request.param)
+    use(saved)
+
+#===============================================================================
+# doctest
+#===============================================================================
+
+def test_doctest(validator):
+   saved = backend()
+   result = doctest.testmod(neurotron.math.backend, verbose=False)
+   assert result.failed == 0
+   assert backend() is saved           # doctests keep the selection
+
+#===============================================================================
+# parity of primitives
+#===============================================================================
+
+def same(A,B):
+    return A.dtype == B.dtype and A.shape == B.shape and np.array_equal(A,B)
+
+def test_primitives(be):
+    ref = Reference();  rng = np.random.RandomState(0)
+    v = rng.rand(20);  index = rng.randint(0,20,(5,3,4))
+    X = rng.randint(0,20,(6,3,4)) / 8;  Y = rng.rand(6,3,4) - 0.5
+    k = np.array([0,3,5]);  B = rng.rand(7,4) > 0.5
+    C = rng.randint(-1,2,(7,4))
+    assert same(be.gather(v,index),ref.gather(v,index))
+    assert same(be.masked_add(X,Y,k),ref.masked_add(X,Y,k))
+    assert same(be.clip(Y.copy(),0,1),ref.clip(Y.copy(),0,1))
+    assert same(be.clip(Y.T.copy().T,0,1),ref.clip(Y.copy(),0,1))
+    assert same(be.threshold(X,0.5),ref.threshold(X,0.5))
+    assert same(be.reduce(X),ref.reduce(X))    # exact: sums of k/8
+    assert same(be.reduce(B),ref.reduce(B))
+    assert same(be.AND(B,C),ref.AND(B,C))
+    assert same(be.OR(B,C),ref.OR(B,C))
+    assert same(be.NOT(C),ref.NOT(C))
+
+#===============================================================================
+# parity of cluster runs
+#===============================================================================
+
+def run(sparse):                       # learning run of a small cluster
+    cells = Cluster(2,8,4,3,sparse=sparse)
+    cells.connect([0,2,4],[1,3,5]);  cells.connect([1,3,5],[6,8,10])
+    rng = np.random.RandomState(1);  states = []
+    for t in range(20):
+        y = cells.embed(list((rng.rand(8) > 0.5).astype(int)))
+        cells.iterate(y)
+        states.append((np.asarray(cells.Y).copy(),np.asarray(cells.X).copy()))
+    return states,cells._predict.P.data.copy()
+
+@pytest.mark.parametrize('sparse',[False,True])
+def test_cluster(be,sparse):
+    states,P = run(sparse)
+    use('reference')
+    ref_states,ref_P = run(sparse)
+    assert np.array_equal(P,ref_P)
+    for (Y,X),(rY,rX) in zip(states,ref_states):
+        assert np.array_equal(Y,rY) and np.array_equal(X,rX)
@@ -0,0 +1,26 @@
+# test_data.py: test neurotron.data module
+
+import doctest
+import pytest
+
+import neurotron.data
+
+#===============================================================================
+# fixture
+#===============================================================================
+
+@pytest.fixture
+def validator():
+    return Validator()
+
+class Validator:
+    def call(self,func) -> bool:
+        return func()
+
+#===============================================================================
+# doctest
+#===============================================================================
+
+def test_doctest(validator):
+   result = doctest.testmod(neurotron.data)
+   assert result.failed == 0
@@ -0,0 +1,26 @@
+# test_import.py: test headless import of neurotron (matplotlib deferred)
+
+import subprocess
+import sys
+
+#===============================================================================
+# helper
+#===============================================================================
+
+def loaded(code):       # run code in a fresh interpreter, is matplotlib loaded?
+    code += '; import sys; print("matplotlib" in sys.modules)'
+    out = subprocess.run([sys.executable,'-c',code],capture_output=True,
+                         text=True,check=True)
+    return out.stdout.split()[-1] == 'True'
+
+#===============================================================================
+# tests
+#===============================================================================
+
+def test_headless():
+    assert not loaded('import neurotron')
+    assert not loaded('from neurotron import Cells, Trainer; Cells("Mary")')
+
+def test_monitor():
+    assert loaded('import matplotlib; matplotlib.use("Agg"); '
+                  'from neurotron import Monitor; Monitor(1,3)')
@@ -0,0 +1,69 @@
+# test_kernel.py: test fused step kernel against Core.iterate()
+
+import doctest
+import pytest
+import numpy as np
+
+import neurotron.cluster.kernel
+from neurotron.cluster.kernel import step
+from neurotron.cluster.cells import Cluster
+
+#===============================================================================
+# fixture
+#===============================================================================
+
+@pytest.fixture
+def validator():
+    return Validator()
+
+class Validator:
+    def call(self,func) -> bool:
+        return func()
+
+#===============================================================================
+# doctest
+#===============================================================================
+
+def test_doctest(validator):
+   result = doctest.testmod(neurotron.cluster.kernel, verbose=False)
+   assert result.failed == 0
+
+#===============================================================================
+# bit-identical parity with Core.iterate()
+#===============================================================================
+
+def snapshot(cells,y):                 # raw bytes of all state touched
+    predict = cells._predict
+    return [cells.data.tobytes(),np.asarray(y).tobytes(),
+            predict.P.data.tobytes(),predict.W.data.tobytes(),
+            predict.I.data.tobytes(),predict.updates]
+
+def twins(shape,f,seed):               # two equal randomly wired clusters
+    pair = []
+    for k in range(2):
+        np.random.seed(seed)
+        pair.append(Cluster(*shape,f=f,rand=True))
+    return pair
+
+JIT = [False,True] if neurotron.cluster.kernel.available else [False]
+
+@pytest.mark.parametrize('jit',JIT)
+@pytest.mark.parametrize('shape,f',[((2,5,2,3),5),((3,8,4,3),6),
+                                    ((1,6,2,2),8),((4,10,3,4),10)])
+def test_parity(shape,f,jit):
+    ref,fus = twins(shape,f,seed=len(shape)+sum(shape))
+    rng = np.random.RandomState(0)
+    for t in range(40):
+        ref.learning = fus.learning = t % 10 != 9
+        F = list((rng.rand(f) > 0.6).astype(int))
+        y = ref.iterate(ref.embed(F))
+        z = step(fus,fus.embed(F),jit=jit)
+        assert snapshot(ref,y) == snapshot(fus,z)
+    assert ref._predict.updates > 0
+
+def test_fallback():
+    cells = Cluster(2,5,2,3,sparse=True);  cells.fused = True
+    cells.connect([0,1,2],[4,6,8])
+    assert not neurotron.cluster.kernel.fused(cells)
+    y = cells.iterate(cells.embed([1,1,1,0,0]))
+    assert cells.X.tolist() == [[0,0,1,1,1],[0,0,0,0,0]]
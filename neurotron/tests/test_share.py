@@ -0,0 +1,26 @@
+# test_share.py: test neurotron.cluster.share module
+
+import doctest
+import pytest
+
+import neurotron.cluster.share
+
+#===============================================================================
+# fixture
+#===============================================================================
+
+@pytest.fixture
+def validator():
+    return Validator()
+
+class Validator:
+    def call(self,func) -> bool:
+        return func()
+
+#===============================================================================
+# doctest
+#===============================================================================
+
+def test_doctest(validator):
+   result = doctest.testmod(neurotron.cluster.share)
+   assert result.failed == 0
@@ -0,0 +1,26 @@
+# test_sparse.py: test neurotron.cluster.sparse module
+
+import doctest
+import pytest
+
+import neurotron.cluster.sparse
+
+#===============================================================================
+# fixture
+#===============================================================================
+
+@pytest.fixture
+def validator():
+    return Validator()
+
+class Validator:
+    def call(self,func) -> bool:
+        return func()
+
+#===============================================================================
+# doctest
+#===============================================================================
+
+def test_doctest(validator):
+   result = doctest.testmod(neurotron.cluster.sparse)
+   assert result.failed == 0